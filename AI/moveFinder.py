@@ -1,12 +1,55 @@
+import json
+import math
 import random
+import time
 import config
 from .evaluation import scoreBoard, pieceScore
-from Engine.move import Move  
+from .transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from Engine.move import Move, SQUARE_COORDS, ENPASSANT_FLAG, PROMOTION_FLAG, NULL_MOVE
 
-# Global variables to store the best move found and the search depth
-nextMove = None
-current_search_depth = 3 
-transpositionTable = {}
+# Distance from the root (in plies) the search tables are sized for
+MAX_PLY = 64
+LIMIT_CHECK_INTERVAL = 1024  # nodes between two clock reads
+# Quiet move tables are indexed by the from and to squares of a move (code & FROM_TO_MASK)
+FROM_TO_MASK = 4095
+HISTORY_LIMIT = 1 << 20  # once a history score gets past this, all of them are halved
+# Root ordering: captures, then killers, then the other quiet moves by history
+CAPTURE_ORDER_BONUS = 2 * HISTORY_LIMIT + 1000
+KILLER_ORDER_BONUS = HISTORY_LIMIT + 1
+
+# Raised inside the search when the time or node budget runs out
+class SearchAborted(Exception):
+    pass
+
+# Principal variation search: moves after the first are searched with a window this wide (the
+# evaluation works in tenths of a pawn, so nothing real fits between alpha and alpha + NULL_WINDOW)
+NULL_WINDOW = 0.01
+# A node is searched with a null window when beta - alpha is below this: the bounds are floats, so
+# beta - alpha of a null window comes out a rounding error above or below NULL_WINDOW, while any real
+# window is at least a tenth of a pawn wide
+NULL_WINDOW_LIMIT = 2 * NULL_WINDOW
+# Aspiration windows: each iteration first searches this far (in pawns) around the score of the last
+# one, and widens the side that failed by ASPIRATION_GROWTH times until the score fits
+ASPIRATION_WINDOW = 0.5
+ASPIRATION_GROWTH = 4
+# Null move pruning: the null move is searched this much shallower than a real move would be
+# (one more from NULL_MOVE_DEEP_DEPTH on), and only NULL_MOVE_MIN_DEPTH plies or more above the horizon
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_DEEP_DEPTH = 6
+NULL_MOVE_MIN_DEPTH = 3
+# Late move reductions: quiet moves late in the order are first searched
+# lmrReductions[depth][moveNumber] = int(LMR_BASE + ln(depth) * ln(moveNumber) / LMR_DIVISOR) plies
+# shallower, from LMR_MIN_DEPTH on and after the first LMR_MIN_MOVES moves (see setReductions)
+LMR_BASE = 0.5
+LMR_DIVISOR = 2.5
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3
+LMR_MAX_MOVES = 63
+lmrReductions = []
+
+# Delta pruning margin (in pawns): a capture is not searched if winning the captured piece plus this
+# much still leaves the side to move below alpha
+DELTA_MARGIN = 2
 
 """
 This function checks if we can play a specific opening strategy (e.g., Napoleon's Plan/Scholar's Mate).
@@ -72,121 +115,621 @@ def findRandomMoves(validMoves):
     return validMoves[random.randint(0, len(validMoves) - 1)]
 
 """
-This is a helper method to make the first calls for the actual algorithm.
-It initializes the global variables and starts the NegaMax search.
+Turns a line of move codes played from the position of gs into text, like "e4 e5 Nf3".
+"""
+def formatVariation(gs, variation):
+    moves = []
+    for code in variation:
+        move = Move.fromCode(code, gs.board)
+        moves.append(str(move))
+        gs.makeMoveCode(code)
+    for _ in variation:
+        gs.undoMove()
+    return " ".join(moves)
+
+"""
+This is a helper method to make the first calls for the actual algorithm, kept for the callers that
+use a queue: plays from the opening book if it can, otherwise searches with the default searcher
+(see Searcher.search for the limits) and puts the best Move (None if there is none) on returnQueue.
+The full result (score, principal variation, ...) is left in getDefaultSearcher().lastResult.
 """
-def findBestMoveMinMax(gs, validMoves, returnQueue, depth):
-    global nextMove, current_search_depth
-    nextMove = None
-    current_search_depth = depth # Update the global depth variable
-    transpositionTable.clear() # Clear memory for the new turn
-    
+def findBestMoveMinMax(gs, validMoves, returnQueue, depth=None, timeLimit=None, nodeLimit=None):
+    searchDepth(depth, timeLimit, nodeLimit)
+    searcher = getDefaultSearcher()
     # OPENING BOOK CHECK 
     # Before starting the heavy calculation, check if we have a prepared opening move
     openingMove = findOpeningMove(gs)
     if openingMove is not None:
         print("Playing from Opening Book (Napoleon's Plan)!")
+        searcher.lastResult = SearchResult(openingMove.code, pv=[openingMove.code])
         returnQueue.put(openingMove)
         return # Exit immediately, no need to calculate
 
-    random.shuffle(validMoves)
-    
-    # Start the recursive search
-    findMoveNegaMaxAlphaBeta(gs, validMoves, depth, -config.CHECKMATE, config.CHECKMATE, 1 if gs.whiteToMove else -1)
-    
-    # Return the best move found
-    returnQueue.put(nextMove)
-
-"""
-Implementing the Nega-Max algorithm with Alpha-Beta pruning.
-This function works recursively to find the best score for the current player.
-"""
-def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier):
-    global nextMove
-    
-    # Create a unique hash key for the current board state
-    boardHash = str(gs.board) + str(gs.whiteToMove) 
-    
-    # Check Transposition Table
-    if boardHash in transpositionTable:
-        entry = transpositionTable[boardHash]
-        if entry['depth'] >= depth:
-            if entry['flag'] == 'exact':
-                return entry['score']
-            elif entry['flag'] == 'lower' and entry['score'] > alpha:
-                alpha = entry['score']
-            elif entry['flag'] == 'upper' and entry['score'] < beta:
-                beta = entry['score']
-            if alpha >= beta:
-                return entry['score']
-    
-    # Base case: if we reached the maximum depth, return the board evaluation
-    if depth == 0:
-        return turnMultiplier * scoreBoard(gs)
-
-    # Move Ordering: Search better moves first to improve Alpha-Beta pruning efficiency
-    orderedMoves = orderMoves(validMoves)
-    maxScore = -config.CHECKMATE
-    originalAlpha = alpha
-    
-    for move in orderedMoves:
-        gs.makeMove(move)
-        nextMoves = gs.getValidMoves()
-        
-        # Recursive call: flip alpha and beta and negate the score
-        score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier)
-        
-        if score > maxScore:
-            maxScore = score
-            
-            # The Trick: We only want to update the 'nextMove' if we are at the top level 
-            # of the recursion tree (when current depth matches the search depth).
-            if depth == current_search_depth: 
-                nextMove = move
-                
-        gs.undoMove()
-        
-        # Alpha-Beta Pruning logic
-        if maxScore > alpha:
-            alpha = maxScore
-        if alpha >= beta:
-            break
-        
-    # Store result in Transposition Table
-    entryFlag = 'exact'
-    if maxScore <= originalAlpha:
-        entryFlag = 'upper'
-    elif maxScore >= beta:
-        entryFlag = 'lower'
-        
-    transpositionTable[boardHash] = {
-        'score': maxScore,
-        'depth': depth,
-        'flag': entryFlag
+    # The search works on packed move codes, only the final answer is turned back into a Move
+    result = searcher.search(gs, [move.code for move in validMoves], depth, timeLimit, nodeLimit)
+    returnQueue.put(Move.fromCode(result.bestMove, gs.board) if result.bestMove is not None else None)
+
+# The searcher behind findBestMoveMinMax, made on its first call (most processes never need its table)
+defaultSearcher = None
+
+def getDefaultSearcher():
+    global defaultSearcher
+    if defaultSearcher is None:
+        defaultSearcher = Searcher()
+    return defaultSearcher
+
+"""
+Checks the limits of a search and returns the depth to deepen to: `depth`, or MAX_PLY when only
+a time or node limit is given. Raises ValueError when none of the three is given, as such a search
+would never end.
+"""
+def searchDepth(depth, timeLimit, nodeLimit):
+    if depth is None and timeLimit is None and nodeLimit is None:
+        raise ValueError("A search needs a depth, a time limit or a node limit")
+    return depth if depth is not None else MAX_PLY
+
+"""
+Effective branching factor of a search: the nodes of its last iteration over those of the one before.
+`iterations` are (depth, nodes, seconds, score) with the nodes counted from the start of the search.
+None with fewer than two iterations.
+"""
+def branchingFactor(iterations):
+    if len(iterations) < 2:
+        return None
+    lastNodes = iterations[-1][1] - iterations[-2][1]
+    previousNodes = iterations[-2][1] - (iterations[-3][1] if len(iterations) >= 3 else 0)
+    return lastNodes / previousNodes if previousNodes else None
+
+# The counters of a search, in the order of Searcher.counters (see Searcher.resetStats; ttStores,
+# ttOverwrites and ttCollisions are the transposition table's own), selDepth last
+COUNTER_NAMES = ("qNodes", "ttProbes", "ttHits", "ttCutoffs", "cutoffs", "firstMoveCutoffs", "nullMoveCutoffs",
+                 "ttStores", "ttOverwrites", "ttCollisions", "selDepth")
+
+"""
+The stats of a search, as a dict:
+    nodes, qNodes            all nodes / those of the quiescence search
+    nodesPerSecond
+    branchingFactor          effective branching factor (see branchingFactor)
+    ttProbes, ttHits, ttHitRate, ttCutoffs   ttCutoffs = nodes that returned the stored score unsearched
+    ttStores, ttOverwrites, ttCollisions     see TranspositionTable
+    ttSizeMB, ttFillRate     size and share of used slots of `table` (TranspositionTable.stats), if given
+    cutoffs, firstMoveCutoffRate             beta cutoffs, and the share of them made by the first move tried
+    nullMoveCutoffs          nodes cut off by null move pruning
+    selDepth                 deepest ply reached (quiescence included)
+    iterations               [{"depth", "nodes", "time", "score"}] per completed iteration, nodes and
+                             time counted from the start of the search
+`counters` are those of Searcher.counters (see COUNTER_NAMES),
+`iterations` (depth, nodes, seconds, score) tuples.
+"""
+def searchStats(nodes, counters, iterations, elapsed, table=None):
+    (qNodes, ttProbes, ttHits, ttCutoffs, cutoffs, firstMoveCutoffs, nullMoveCutoffs,
+     ttStores, ttOverwrites, ttCollisions, selDepth) = counters
+    stats = {
+        "nodes": nodes,
+        "qNodes": qNodes,
+        "nodesPerSecond": nodes / elapsed if elapsed > 0 else 0.0,
+        "branchingFactor": branchingFactor(iterations),
+        "ttProbes": ttProbes,
+        "ttHits": ttHits,
+        "ttHitRate": ttHits / ttProbes if ttProbes else 0.0,
+        "ttCutoffs": ttCutoffs,
+        "ttStores": ttStores,
+        "ttOverwrites": ttOverwrites,
+        "ttCollisions": ttCollisions,
+        "cutoffs": cutoffs,
+        "firstMoveCutoffRate": firstMoveCutoffs / cutoffs if cutoffs else 0.0,
+        "nullMoveCutoffs": nullMoveCutoffs,
+        "selDepth": selDepth,
+        "iterations": [{"depth": depth, "nodes": iterationNodes, "time": seconds, "score": score}
+                       for depth, iterationNodes, seconds, score in iterations],
     }
-            
-    return maxScore
+    if table is not None:
+        tableStats = table.stats()
+        stats["ttSizeMB"] = tableStats["sizeMB"]
+        stats["ttFillRate"] = tableStats["fillRate"]
+    return stats
+
+"""
+Appends a search to the JSON lines file at `path`: one object per line with the position searched
+(FEN), the move found, its score, depth and principal variation, the time taken and the stats.
+"""
+def writeSearchLog(path, gs, result):
+    entry = {
+        "time": time.time(),
+        "fen": gs.toFEN(),
+        "bestMove": (Move.fromCode(result.bestMove, gs.board).getChessNotation()
+                     if result.bestMove is not None else None),
+        "score": result.score,
+        "depth": result.depth,
+        "pv": formatVariation(gs, result.pv),
+        "elapsed": result.elapsed,
+    }
+    entry.update(result.stats)
+    with open(path, "a") as file:
+        file.write(json.dumps(entry) + "\n")
+
+"""
+Rebuilds the late move reduction table, e.g. to tune the search (it is shared by all searchers).
+A reduction never takes a move below depth 1, so reduced moves are still searched before quiescence.
+"""
+def setReductions(base=LMR_BASE, divisor=LMR_DIVISOR):
+    global lmrReductions
+    lmrReductions = [[0] * (LMR_MAX_MOVES + 1) for _ in range(MAX_PLY + 1)]
+    for depth in range(LMR_MIN_DEPTH, MAX_PLY + 1):
+        for moveNumber in range(1, LMR_MAX_MOVES + 1):
+            reduction = int(base + math.log(depth) * math.log(moveNumber) / divisor)
+            lmrReductions[depth][moveNumber] = max(0, min(reduction, depth - 2))
+
+setReductions()
 
 """
 Orders the moves list based on a heuristic score.
-Logic used: MVV-LVA (Most Valuable Victim - Least Valuable Aggressor).
+Logic used: MVV-LVA (Most Valuable Victim - Least Valuable Aggressor) for captures.
 Meaning: Capturing a Queen with a Pawn is better than capturing a Pawn with a Queen.
+Quiet moves come after them: the `killers` first, then the rest by their `history` score (if given).
+Captures that lose material by static exchange (GameState.staticExchange) come last.
 """
-def orderMoves(moves):
+def orderMoves(gs, moves, killers=(), history=None):
+    board = gs.board
     def moveScore(move):
         score = 0
-        if move.isCapture:
+        endRow, endCol = SQUARE_COORDS[(move >> 6) & 63]
+        pieceCaptured = board[endRow][endCol]
+        if pieceCaptured != "--" or move & ENPASSANT_FLAG:
             # Get the value of the piece being captured (The Victim)
-            victimValue = pieceScore.get(move.pieceCaptured[1], 0)
+            victimValue = pieceScore.get(pieceCaptured[1], 0) if pieceCaptured != "--" else pieceScore["p"]
             
             # Get the value of the piece moving (The Aggressor)
-            attackerValue = pieceScore.get(move.pieceMoved[1], 0)
+            startRow, startCol = SQUARE_COORDS[move & 63]
+            attackerValue = pieceScore.get(board[startRow][startCol][1], 0)
             
             # Heuristic Formula: 10 * Victim - Aggressor
-            score = 10 * victimValue - attackerValue
+            # (offset so every capture goes before every quiet move, except the ones that lose
+            # material by static exchange: they go last, scored by how much they lose)
+            if gs.isLosingCapture(move):
+                score = gs.staticExchange(move)
+            else:
+                score = CAPTURE_ORDER_BONUS + 10 * victimValue - attackerValue
+        elif move in killers:
+            # Quiet moves: the killers first, then by history
+            score = KILLER_ORDER_BONUS
+        elif history is not None:
+            score = history[move & FROM_TO_MASK]
             
         return score
 
     # Sort the moves in descending order (highest score first)
     moves.sort(key=moveScore, reverse=True)
-    return moves
\ No newline at end of file
+    return moves
+
+
+"""
+What a search returns:
+    bestMove  packed code of the move to play, None if there was nothing to search
+    score     its score for the side to move (in pawns, +-config.CHECKMATE for a mate)
+    depth     depth of the last completed iteration (0 if the only legal move was returned unsearched)
+    pv        the principal variation: move codes starting with bestMove
+    nodes     positions searched (main search and quiescence)
+    elapsed   seconds the search took
+    stats     what the search cost, a dict (see searchStats)
+"""
+class SearchResult:
+    def __init__(self, bestMove=None, score=0, depth=0, pv=(), nodes=0, elapsed=0.0, stats=None):
+        self.bestMove = bestMove
+        self.score = score
+        self.depth = depth
+        self.pv = list(pv)
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.stats = stats if stats is not None else {}
+
+
+"""
+One search engine: the NegaMax search with everything it keeps between and during searches
+(transposition table, killer/history/countermove tables, limits, node count).
+Searchers share nothing, so several can search at the same time in one process (each on its own
+GameState); the module-level findBestMoveMinMax uses getDefaultSearcher().
+`transpositionTable` may be given, e.g. a SharedTranspositionTable, otherwise one of ttSizeMB is made.
+"""
+class Searcher:
+    def __init__(self, transpositionTable=None, ttSizeMB=config.TT_SIZE_MB):
+        # Fixed-size table of searched positions (see AI/transposition.py), kept between searches
+        self.transpositionTable = transpositionTable if transpositionTable is not None else TranspositionTable(ttSizeMB)
+        # killerMoves[ply] = the last two quiet moves that caused a beta cutoff at that distance from the root
+        self.killerMoves = [[None, None] for _ in range(MAX_PLY)]
+        # Kept between searches: historyScores = how much (depth squared) each quiet move caused beta
+        # cutoffs, counterMoves = the quiet move that last refuted each move of the opponent
+        self.historyScores = [0] * 4096
+        self.counterMoves = [None] * 4096
+        # pvTable[ply] = the best line found from the node at that ply, as a tuple of move codes
+        self.pvTable = [() for _ in range(MAX_PLY + 2)]
+        self.rootPly = 0  # length of the move log at the root; a node's ply is its distance from there
+        self.rootBestMove = None  # best root move of the iteration being searched
+        # Limits of the current search (see startLimits)
+        self.deadline = None  # time.perf_counter() value after which the search stops, None = no time limit
+        self.nodeLimit = None  # number of nodes after which the search stops, None = no node limit
+        self.nodes = 0  # nodes visited so far (main search and quiescence)
+        self.nextLimitCheck = 0  # node count at which the limits are checked next
+        self.limitsActive = False  # the limits only apply once the first iteration has produced a move
+        # Optional function polled with the limits; once it returns True the search stops (see AI/worker.py)
+        self.stopRequested = None
+        self.lastResult = None  # SearchResult of the last search
+        # File every search appends its result and stats to, as one JSON line (None = no log)
+        self.logPath = config.SEARCH_LOG
+        self.resetStats()
+
+    # Forgets everything learned, for a new game
+    def newGame(self):
+        self.transpositionTable.clear()
+        self.historyScores = [0] * 4096
+        self.counterMoves = [None] * 4096
+
+    # Counters of the current search (the node count is reset by startLimits), the table's included
+    def resetStats(self):
+        self.transpositionTable.resetStats()
+        self.qNodes = 0  # nodes of the quiescence search
+        self.ttProbes = 0
+        self.ttHits = 0
+        self.ttCutoffs = 0  # nodes that returned the stored score without being searched
+        self.cutoffs = 0  # beta cutoffs in the main search
+        self.firstMoveCutoffs = 0  # ... that came from the first move searched
+        self.nullMoveCutoffs = 0  # nodes cut off by null move pruning
+        self.selDepth = 0  # deepest ply reached, quiescence included
+        self.iterations = []  # (depth, nodes, seconds, score) for every completed iteration
+
+    # The counters of resetStats and of the transposition table, in the order of COUNTER_NAMES
+    def counters(self):
+        table = self.transpositionTable
+        return (self.qNodes, self.ttProbes, self.ttHits, self.ttCutoffs, self.cutoffs, self.firstMoveCutoffs,
+                self.nullMoveCutoffs, table.stores, table.overwrites, table.collisions, self.selDepth)
+
+    # What the current (or last) search cost, see searchStats
+    def stats(self, elapsed):
+        return searchStats(self.nodes, self.counters(), self.iterations, elapsed, self.transpositionTable)
+
+    """
+    Searches the position of gs with iterative deepening:
+    depth 1, 2, 3, ... up to `depth`, until `timeLimit` seconds or `nodeLimit` nodes are used up.
+    An iteration that runs out of budget is abandoned and the best move of the last completed one is
+    played; each iteration searches the previous best move first, within an aspiration window around
+    the previous score, and reuses the transposition table and killers of the ones before it.
+    Without time and node limits this is a plain fixed-depth search; at least one of the three limits
+    must be given (see searchDepth). `moveCodes` are the legal moves of the position
+    (generated if not given). Returns a SearchResult (also kept in lastResult); gs is left as it was.
+    With a logPath the result is also appended to that file (see writeSearchLog).
+    """
+    def search(self, gs, moveCodes=None, depth=None, timeLimit=None, nodeLimit=None):
+        depth = searchDepth(depth, timeLimit, nodeLimit)
+        startTime = time.perf_counter()
+        self.transpositionTable.newSearch() # Entries from earlier turns become the first to be replaced
+        for killers in self.killerMoves:
+            killers[0] = killers[1] = None
+        self.ageHistory()
+        self.startLimits(startTime, timeLimit, nodeLimit)
+        self.resetStats()
+
+        moveCodes = list(moveCodes) if moveCodes is not None else gs.getValidMoveCodes()
+        random.shuffle(moveCodes)
+        moveCodes = self.orderMoves(gs, moveCodes)
+        if len(moveCodes) <= 1:
+            # nothing to choose from
+            elapsed = time.perf_counter() - startTime
+            self.lastResult = SearchResult(moveCodes[0] if moveCodes else None, pv=moveCodes, elapsed=elapsed,
+                                           stats=self.stats(elapsed))
+            return self.lastResult
+
+        rootPly = len(gs.moveLog)
+        self.rootPly = rootPly
+        result = SearchResult()
+        turnMultiplier = 1 if gs.whiteToMove else -1
+        score = 0  # score of the last completed iteration, the centre of the next aspiration window
+        for iterationDepth in range(1, depth + 1):
+            self.rootBestMove = None
+            # Aspiration window around the score of the last iteration (the first one has nothing to go by)
+            window = ASPIRATION_WINDOW
+            if iterationDepth > 1:
+                alpha, beta = max(score - window, -config.CHECKMATE), min(score + window, config.CHECKMATE)
+            else:
+                alpha, beta = -config.CHECKMATE, config.CHECKMATE
+            try:
+                while True:
+                    score = self.findMoveNegaMaxAlphaBeta(gs, moveCodes, iterationDepth, alpha, beta, turnMultiplier)
+                    if score <= alpha and alpha > -config.CHECKMATE:
+                        # Fail low: every move is worse than expected, only an upper bound is known
+                        window *= ASPIRATION_GROWTH
+                        alpha = max(score - window, -config.CHECKMATE)
+                    elif score >= beta and beta < config.CHECKMATE:
+                        # Fail high: the move that beat the window goes first in the re-search
+                        window *= ASPIRATION_GROWTH
+                        beta = min(score + window, config.CHECKMATE)
+                        moveCodes.remove(self.rootBestMove)
+                        moveCodes.insert(0, self.rootBestMove)
+                    else:
+                        break
+            except SearchAborted:
+                # unwind the moves the abandoned iteration left on the board
+                while len(gs.moveLog) > rootPly:
+                    gs.undoMove()
+                break
+            bestMove = self.rootBestMove
+            result.bestMove = bestMove
+            result.score = score
+            result.depth = iterationDepth
+            result.pv = list(self.pvTable[0])
+            self.iterations.append((iterationDepth, self.nodes, time.perf_counter() - startTime, score))
+            self.limitsActive = True
+            if bestMove is None or abs(score) >= config.CHECKMATE:
+                break
+            # Search the best move first in the next iteration, the others by what this one learned
+            moveCodes.remove(bestMove)
+            moveCodes = [bestMove] + self.orderMoves(gs, moveCodes)
+            # The next iteration takes several times longer than this one, don't start what can't finish
+            if self.deadline is not None and time.perf_counter() - startTime > timeLimit / 2:
+                break
+            if self.nodeLimit is not None and self.nodes > self.nodeLimit / 2:
+                break
+
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - startTime
+        result.stats = self.stats(result.elapsed)
+        self.lastResult = result
+        if self.logPath is not None:
+            writeSearchLog(self.logPath, gs, result)
+        return result
+
+    def orderMoves(self, gs, moves):
+        return orderMoves(gs, moves, self.killerMoves[0], self.historyScores)
+
+    # A quiet move caused a beta cutoff `depth` plies above the horizon: deeper cutoffs count more
+    def addHistory(self, move, depth):
+        historyScores = self.historyScores
+        index = move & FROM_TO_MASK
+        historyScores[index] += depth * depth
+        if historyScores[index] > HISTORY_LIMIT:
+            self.ageHistory()
+
+    # Halves the history scores, so what was learned in earlier positions slowly fades out
+    def ageHistory(self):
+        historyScores = self.historyScores
+        for index in range(len(historyScores)):
+            historyScores[index] >>= 1
+
+    """
+    Resets the node count and sets the limits of a new search: `timeLimit` seconds after `startTime`
+    (a time.perf_counter() value) and `nodeLimit` nodes, None for no limit.
+    The limits start switched off (limitsActive), so the first iteration always finishes.
+    """
+    def startLimits(self, startTime, timeLimit, nodeLimit):
+        self.deadline = startTime + timeLimit if timeLimit is not None else None
+        self.nodeLimit = nodeLimit
+        self.nodes = 0
+        self.nextLimitCheck = LIMIT_CHECK_INTERVAL
+        self.limitsActive = False
+
+    """
+    Counts a node and every LIMIT_CHECK_INTERVAL nodes checks the time and node budget,
+    raising SearchAborted when one of them is used up or a stop was requested.
+    """
+    def countNode(self):
+        self.nodes += 1
+        if self.nodes >= self.nextLimitCheck:
+            nodes = self.nodes
+            nodeLimit = self.nodeLimit
+            self.nextLimitCheck = nodes + LIMIT_CHECK_INTERVAL
+            if nodeLimit is not None and nodes < nodeLimit:
+                self.nextLimitCheck = min(self.nextLimitCheck, nodeLimit)
+            if self.stopRequested is not None and self.stopRequested():
+                raise SearchAborted()
+            if self.limitsActive:
+                if nodeLimit is not None and nodes >= nodeLimit:
+                    raise SearchAborted()
+                if self.deadline is not None and time.perf_counter() >= self.deadline:
+                    raise SearchAborted()
+
+    """
+    Implementing the Nega-Max algorithm with Alpha-Beta pruning.
+    This function works recursively to find the best score for the current player.
+    `validMoves` is only given at the root; below it moves come lazily from gs.pickMoves, so a
+    node that is cut off early never generates the moves it would not have searched.
+    The best line from the node is left in pvTable[ply] when its score falls inside (alpha, beta).
+    """
+    def findMoveNegaMaxAlphaBeta(self, gs, validMoves, depth, alpha, beta, turnMultiplier):
+        self.countNode()
+        ply = len(gs.moveLog) - self.rootPly
+        self.pvTable[ply] = ()
+
+        # A position seen before since the last irreversible move is scored as a draw: whatever was
+        # good enough to reach it once can be repeated until it is threefold
+        if ply > 0 and gs.repetitions.repeatedSinceIrreversible():
+            return config.STALEMATE
+
+        # Zobrist key of the current board state (maintained incrementally by the GameState)
+        boardHash = gs.zobristKey
+        hashMove = None
+
+        # Check Transposition Table. Its score only ends null-window searches; in the principal variation
+        # (the root included, which has to pick a move) the node is searched to get the best line in full
+        entry = self.transpositionTable.probe(boardHash)
+        self.ttProbes += 1
+        if entry is not None:
+            self.ttHits += 1
+            entryScore, entryDepth, entryFlag, hashMove = entry
+            if entryDepth >= depth and beta - alpha < NULL_WINDOW_LIMIT:
+                if entryFlag == EXACT:
+                    self.ttCutoffs += 1
+                    return entryScore
+                elif entryFlag == LOWER_BOUND and entryScore > alpha:
+                    alpha = entryScore
+                elif entryFlag == UPPER_BOUND and entryScore < beta:
+                    beta = entryScore
+                if alpha >= beta:
+                    self.ttCutoffs += 1
+                    return entryScore
+
+        # Base case: at the maximum depth, play out the captures before evaluating
+        if depth == 0:
+            return self.quiescenceSearch(gs, alpha, beta, turnMultiplier)
+
+        # Null move pruning: let the opponent move twice in a row. If a shallower search still fails high,
+        # the position is so good that a real move would fail high too. Only off the principal variation,
+        # not in check, not twice in a row, and not without pieces: in pawn endings zugzwang is common,
+        # and there passing would be the best move when it isn't allowed
+        if (depth >= NULL_MOVE_MIN_DEPTH and ply > 0 and beta - alpha < NULL_WINDOW_LIMIT and
+                abs(beta) < config.CHECKMATE and gs.moveLog[-1] != NULL_MOVE and gs.hasNonPawnMaterial()):
+            gs.prepareMoveGeneration()
+            if not gs.inCheck and turnMultiplier * scoreBoard(gs) >= beta:
+                reduction = NULL_MOVE_REDUCTION + (1 if depth >= NULL_MOVE_DEEP_DEPTH else 0)
+                gs.makeNullMove()
+                score = -self.findMoveNegaMaxAlphaBeta(gs, None, max(depth - 1 - reduction, 0), -beta,
+                                                       -beta + NULL_WINDOW, -turnMultiplier)
+                gs.undoNullMove()
+                if score >= beta:
+                    self.nullMoveCutoffs += 1
+                    # a mate found after passing is no proof for the real moves
+                    return beta if score >= config.CHECKMATE else score
+
+        previousMove = gs.moveLog[-1] & FROM_TO_MASK if gs.moveLog else None
+        if validMoves is not None:
+            # Root: the list ordered by search
+            moves = validMoves
+        else:
+            # Hash move, captures, killers and the countermove, then quiet moves by history (see GameState.pickMoves)
+            quietFirst = list(self.killerMoves[ply]) if ply < MAX_PLY else []
+            if previousMove is not None:
+                quietFirst.append(self.counterMoves[previousMove])
+            moves = gs.pickMoves(hashMove, quietFirst, self.historyScores)
+        maxScore = -config.CHECKMATE
+        bestMove = None
+        originalAlpha = alpha
+        moveNumber = 0
+
+        for move in moves:
+            if moveNumber == 0:
+                # pickMoves has looked for checks by now
+                inCheck = gs.inCheck
+            # Late move reductions: quiet moves this far down the order rarely turn out best
+            reduction = 0
+            if (ply > 0 and moveNumber >= LMR_MIN_MOVES and depth >= LMR_MIN_DEPTH and not inCheck and
+                    move not in quietFirst and not gs.isCaptureOrPromotion(move)):
+                reduction = lmrReductions[min(depth, MAX_PLY)][min(moveNumber, LMR_MAX_MOVES)]
+            gs.makeMoveCode(move)
+            moveNumber += 1
+
+            # Recursive call: flip alpha and beta and negate the score
+            if bestMove is None:
+                score = -self.findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -beta, -alpha, -turnMultiplier)
+            else:
+                # Principal variation search: with good ordering the first move is the best, so the others
+                # only need to be proven worse with a null window; one that isn't gets the full window.
+                # A reduced move that beats alpha is searched again to full depth first
+                if reduction:
+                    score = -self.findMoveNegaMaxAlphaBeta(gs, None, depth - 1 - reduction, -alpha - NULL_WINDOW,
+                                                           -alpha, -turnMultiplier)
+                if not reduction or score > alpha:
+                    score = -self.findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -alpha - NULL_WINDOW, -alpha,
+                                                           -turnMultiplier)
+                    if alpha < score < beta:
+                        score = -self.findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -beta, -alpha, -turnMultiplier)
+            gs.undoMove()
+
+            if score > maxScore or bestMove is None:
+                maxScore = score
+                bestMove = move
+
+                # The Trick: We only want to update the root's best move if we are at the top level 
+                # of the recursion tree (the root, ply 0).
+                if ply == 0: 
+                    self.rootBestMove = move
+
+            # Alpha-Beta Pruning logic
+            if maxScore > alpha:
+                alpha = maxScore
+                # the best line so far: this move and the best line found below it
+                self.pvTable[ply] = (move,) + self.pvTable[ply + 1]
+            if alpha >= beta:
+                self.cutoffs += 1
+                if moveNumber == 1:
+                    self.firstMoveCutoffs += 1
+                # Remember quiet moves that refute a position, they often refute its siblings too
+                if not gs.isCaptureOrPromotion(move):
+                    if ply < MAX_PLY:
+                        killers = self.killerMoves[ply]
+                        if killers[0] != move:
+                            killers[1] = killers[0]
+                            killers[0] = move
+                    self.addHistory(move, depth)
+                    if previousMove is not None:
+                        self.counterMoves[previousMove] = move
+                break
+
+        if bestMove is None:
+            # No legal moves: checkmate, or stalemate if we are not in check
+            return -config.CHECKMATE if gs.inCheck else config.STALEMATE
+
+        # Store result in Transposition Table
+        entryFlag = EXACT
+        if maxScore <= originalAlpha:
+            entryFlag = UPPER_BOUND
+        elif maxScore >= beta:
+            entryFlag = LOWER_BOUND
+        self.transpositionTable.store(boardHash, maxScore, depth, entryFlag, bestMove)
+
+        return maxScore
+
+    """
+    Quiescence search: at the end of the main search, keep playing captures and promotions until the
+    position is quiet, so a piece left hanging at the horizon is not evaluated as if it were safe.
+    The side to move may decline every capture and "stand pat" with the static evaluation, which is
+    a lower bound on its score; in check it can't, so then every evasion is searched.
+    """
+    def quiescenceSearch(self, gs, alpha, beta, turnMultiplier):
+        self.countNode()
+        self.qNodes += 1
+        ply = len(gs.moveLog) - self.rootPly
+        if ply > self.selDepth:
+            self.selDepth = ply
+        if gs.repetitions.isRepetition():
+            return config.STALEMATE
+
+        moves = gs.getTacticalMoveCodes()
+        if gs.inCheck:
+            if len(moves) == 0:
+                return -config.CHECKMATE
+            bestScore = -config.CHECKMATE
+            standPat = None
+        else:
+            standPat = turnMultiplier * scoreBoard(gs)
+            if standPat >= beta:
+                return standPat
+            if standPat > alpha:
+                alpha = standPat
+            bestScore = standPat
+
+        board = gs.board
+        for move in moves:
+            # Delta pruning: skip captures that can't raise the score to alpha even if the piece is won for free
+            if standPat is not None and not move & PROMOTION_FLAG:
+                if move & ENPASSANT_FLAG:
+                    victim = "p"
+                else:
+                    endRow, endCol = SQUARE_COORDS[(move >> 6) & 63]
+                    victim = board[endRow][endCol][1]
+                if standPat + pieceScore[victim] + DELTA_MARGIN <= alpha:
+                    continue
+                # SEE pruning: a capture that loses material if the opponent recaptures is not searched,
+                # the side to move can always stand pat instead
+                if gs.isLosingCapture(move):
+                    continue
+
+            gs.makeMoveCode(move)
+            score = -self.quiescenceSearch(gs, -beta, -alpha, -turnMultiplier)
+            gs.undoMove()
+
+            if score > bestScore:
+                bestScore = score
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+        return bestScore
+
@@ -0,0 +1,307 @@
+"""
+Parallel search by splitting the root moves over helper processes.
+
+Every helper is a long-lived process with its own GameState and moveFinder.Searcher (killers,
+history, ...), so each helper runs the ordinary single-process search, with one transposition table
+in shared memory (transposition.SharedTranspositionTable) that all helpers attach to, so what one
+helper finds under a root move is known to the others.
+A search deepens iteratively like moveFinder.Searcher.search; at every depth:
+    1. the first root move (the best one of the previous iteration) is searched on its own with the
+       full window, so the others have a real alpha to be cut off against;
+    2. the remaining root moves go on a shared task queue and are searched by whichever helper is free.
+The best score found so far at the root (alpha) lives in shared memory: a helper reads it when it
+starts on a move and raises it when it finds a better one, so later moves are searched with the
+narrowest window known at that moment. A move that scores no better than that alpha only gets an
+upper bound and can't be the best one.
+
+Tasks, put on the task queue:
+    ("search", iterationId, fen, moveCodes, rootMove, depth, deadline, nodeLimit)
+        play rootMove in the game (start FEN + move codes, see worker.syncGame) and search it to depth - 1;
+        deadline is a time.time() value (None = no time limit), nodeLimit the node budget of all
+        helpers together (None = no node limit). Neither applies to the first iteration.
+    ("quit",)
+Results, on the result queue:
+    (iterationId, rootMove, score, exact, pv, counters)
+        score is None if the search was aborted; exact is False for a move that failed low (score <= alpha);
+        pv is the best line after rootMove (empty unless exact); counters are the Searcher.counters
+        of the task, for the stats of the search
+
+Usage (from the project root), to measure the speedup over a single process:
+    python -m AI.parallel --workers 4 --depth 4
+"""
+from multiprocessing import Process, Queue, Value
+import argparse
+import queue
+import random
+import sys
+import time
+
+import config
+from Engine.gameState import createGameState
+from Engine.move import Move
+from .moveFinder import (Searcher, SearchResult, SearchAborted, orderMoves, searchStats, writeSearchLog,
+                         searchDepth, COUNTER_NAMES)
+from .transposition import SharedTranspositionTable
+from .worker import syncGame
+
+RESULT_POLL_INTERVAL = 0.05  # seconds between two checks for a stop while waiting on the helpers
+
+
+def runHelper(tasks, results, sharedAlpha, sharedNodes, stoppedIteration, tableName, backend):
+    gs = createGameState(backend)
+    startFEN = None
+    searcher = Searcher(SharedTranspositionTable(name=tableName))
+
+    while True:
+        task = tasks.get()
+        kind = task[0]
+
+        if kind == "quit":
+            searcher.transpositionTable.close()
+            break
+
+        elif kind == "search":
+            _, iterationId, fen, moveCodes, rootMove, depth, deadline, nodeLimit = task
+            gs = syncGame(gs, startFEN, fen, moveCodes, backend)
+            startFEN = fen
+            if stoppedIteration.value >= iterationId or (deadline is not None and time.time() >= deadline):
+                results.put((iterationId, rootMove, None, False, [], None))
+                continue
+
+            # the deadline is a wall clock time so all processes agree on it
+            searcher.startLimits(time.perf_counter(), deadline - time.time() if deadline is not None else None, None)
+            searcher.limitsActive = deadline is not None
+            searcher.stopRequested = lambda: (
+                stoppedIteration.value >= iterationId or
+                (nodeLimit is not None and sharedNodes.value + searcher.nodes >= nodeLimit))
+            searcher.rootPly = len(moveCodes)
+            searcher.resetStats()
+
+            alpha = sharedAlpha.value
+            turnMultiplier = 1 if gs.whiteToMove else -1
+            gs.makeMoveCode(rootMove)
+            try:
+                score = -searcher.findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -config.CHECKMATE, -alpha,
+                                                            -turnMultiplier)
+            except SearchAborted:
+                score = None
+            searcher.stopRequested = None
+            while len(gs.moveLog) > len(moveCodes):
+                gs.undoMove()
+
+            with sharedNodes.get_lock():
+                sharedNodes.value += searcher.nodes
+            exact = score is not None and score > alpha
+            if exact:
+                with sharedAlpha.get_lock():
+                    if score > sharedAlpha.value:
+                        sharedAlpha.value = score
+            results.put((iterationId, rootMove, score, exact, list(searcher.pvTable[1]) if exact else [],
+                         searcher.counters()))
+
+
+"""
+The searching side: starts the helpers and runs the iterative deepening over them.
+`table` is the shared transposition table to search with (a new one of config.TT_SIZE_MB if not given).
+The helpers live as long as the object, call quit() to stop them.
+Like a Searcher, it takes an optional stopRequested function that stops the search once it returns True,
+and a logPath to append every search to.
+"""
+class ParallelSearch:
+    def __init__(self, workers=config.SEARCH_WORKERS, backend=config.ENGINE_BACKEND, table=None):
+        self.workers = workers
+        self.ownsTable = table is None
+        self.table = table if table is not None else SharedTranspositionTable(config.TT_SIZE_MB)
+        self.tasks = Queue()
+        self.results = Queue()
+        self.sharedAlpha = Value("d", -config.CHECKMATE)
+        self.sharedNodes = Value("q", 0)
+        # id of the last iteration the helpers must give up on (iteration ids only grow)
+        self.stoppedIteration = Value("q", 0)
+        self.lastIterationId = 0
+        self.stopRequested = None
+        self.logPath = config.SEARCH_LOG
+        self.counters = None  # the helpers' Searcher.counters added up over the current search
+        self.helpers = []
+        for _ in range(workers):
+            helper = Process(target=runHelper, args=(self.tasks, self.results, self.sharedAlpha, self.sharedNodes,
+                                                     self.stoppedIteration, self.table.name, backend))
+            helper.daemon = True
+            helper.start()
+            self.helpers.append(helper)
+
+    def newGame(self):
+        self.table.clear()
+
+    def quit(self):
+        for _ in self.helpers:
+            self.tasks.put(("quit",))
+        for helper in self.helpers:
+            helper.join(timeout=1)
+            if helper.is_alive():
+                helper.terminate()
+        if self.ownsTable:
+            self.table.close()
+
+    """
+    Same as moveFinder.Searcher.search, with the search split over the helpers; returns a SearchResult
+    whose nodes and stats are those of all helpers together.
+    startFEN is the position the game in gs started from (None = initial position): the helpers get
+    the game as that FEN and the moves played since.
+    """
+    def search(self, gs, startFEN=None, moveCodes=None, depth=None, timeLimit=None, nodeLimit=None):
+        depth = searchDepth(depth, timeLimit, nodeLimit)
+        startTime = time.time()
+        self.sharedNodes.value = 0
+        self.counters = [0] * len(COUNTER_NAMES)
+        self.table.newSearch()
+
+        moveCodes = list(moveCodes) if moveCodes is not None else gs.getValidMoveCodes()
+        random.shuffle(moveCodes)
+        moveCodes = orderMoves(gs, moveCodes)
+        if len(moveCodes) <= 1:
+            elapsed = time.time() - startTime
+            return SearchResult(moveCodes[0] if moveCodes else None, pv=moveCodes, elapsed=elapsed,
+                                stats=searchStats(0, self.counters, [], elapsed, self.table))
+
+        game = list(gs.moveLog)
+        deadline = startTime + timeLimit if timeLimit is not None else None
+        result = SearchResult()
+        iterations = []
+
+        for iterationDepth in range(1, depth + 1):
+            # the first iteration runs without limits, so there is always a move to play
+            first = iterationDepth == 1
+            scores = self.searchIteration(startFEN, game, moveCodes, iterationDepth,
+                                          None if first else deadline, None if first else nodeLimit)
+            if scores is None:
+                break
+            # best move first, the others by their (exact or upper bound) scores for the next iteration;
+            # an upper bound never goes before an exact score it ties with
+            moveCodes.sort(key=lambda code: (-scores[code][0], not scores[code][1]))
+            bestMove = moveCodes[0]
+            result.bestMove = bestMove
+            result.score = scores[bestMove][0]
+            result.depth = iterationDepth
+            result.pv = [bestMove] + scores[bestMove][2]
+            iterations.append((iterationDepth, self.sharedNodes.value, time.time() - startTime, result.score))
+            if abs(result.score) >= config.CHECKMATE:
+                break
+            if deadline is not None and time.time() - startTime > timeLimit / 2:
+                break
+            if nodeLimit is not None and self.sharedNodes.value > nodeLimit / 2:
+                break
+
+        result.nodes = self.sharedNodes.value
+        result.elapsed = time.time() - startTime
+        result.stats = searchStats(result.nodes, self.counters, iterations, result.elapsed, self.table)
+        if self.logPath is not None:
+            writeSearchLog(self.logPath, gs, result)
+        return result
+
+    """
+    Searches every root move to `depth`: the first one alone, then the rest in parallel.
+    Returns {move: (score, exact, pv)}, or None if the iteration was aborted by a limit or a stop.
+    """
+    def searchIteration(self, startFEN, game, moveCodes, depth, deadline, nodeLimit):
+        self.lastIterationId += 1
+        iterationId = self.lastIterationId
+        self.sharedAlpha.value = -config.CHECKMATE
+        scores = {}
+        for batch in (moveCodes[:1], moveCodes[1:]):
+            for code in batch:
+                self.tasks.put(("search", iterationId, startFEN, game, code, depth, deadline, nodeLimit))
+            aborted = False
+            for _ in batch:
+                resultId, code, score, exact, pv, counters = self.waitForResult(iterationId)
+                if counters is not None:
+                    self.addCounters(counters)
+                if score is None:
+                    aborted = True
+                else:
+                    scores[code] = (score, exact, pv)
+            if aborted:
+                return None
+        return scores
+
+    # Adds the counters of a helper's task to those of the search (selDepth, the last one, is a maximum)
+    def addCounters(self, counters):
+        totals = self.counters
+        for index in range(len(counters) - 1):
+            totals[index] += counters[index]
+        totals[-1] = max(totals[-1], counters[-1])
+
+    # Waits for the next result of iteration `iterationId`, telling the helpers to stop if the
+    # search is stopped from outside (stopRequested, see AI/worker.py) in the meantime
+    def waitForResult(self, iterationId):
+        while True:
+            try:
+                result = self.results.get(timeout=RESULT_POLL_INTERVAL)
+            except queue.Empty:
+                if self.stopRequested is not None and self.stopRequested():
+                    self.stoppedIteration.value = iterationId
+                continue
+            if result[0] == iterationId:
+                return result
+
+
+# --- Speedup report ---
+
+# Move code as text for the report
+def formatMove(gs, code):
+    return Move.fromCode(code, gs.board).getChessNotation() if code is not None else "-"
+
+
+"""
+Searches every position to a fixed depth with the single-process search and with `workers`
+helpers, printing the time, the nodes and the speedup of the parallel search.
+"""
+def runBenchmark(fens, workers, depth, backend=config.ENGINE_BACKEND, out=sys.stdout):
+    search = ParallelSearch(workers, backend)
+    searcher = Searcher()
+    totalSerial = totalParallel = 0.0
+    try:
+        for name, fen in fens.items():
+            gs = createGameState(backend, fen)
+            searcher.newGame()
+            start = time.perf_counter()
+            serial = searcher.search(gs, depth=depth)
+            serialTime = time.perf_counter() - start
+
+            search.newGame()
+            start = time.perf_counter()
+            parallel = search.search(gs, fen, depth=depth)
+            parallelTime = time.perf_counter() - start
+
+            totalSerial += serialTime
+            totalParallel += parallelTime
+            out.write("{:<6} 1 process {:>8.3f}s {:>10,} nodes {}   {} processes {:>8.3f}s {:>10,} nodes {}   "
+                      "speedup {:.2f}x\n".format(
+                          name, serialTime, serial.nodes, formatMove(gs, serial.bestMove),
+                          workers, parallelTime, parallel.nodes, formatMove(gs, parallel.bestMove),
+                          serialTime / parallelTime))
+        out.write("total  1 process {:>8.3f}s   {} processes {:>8.3f}s   speedup {:.2f}x\n".format(
+            totalSerial, workers, totalParallel, totalSerial / totalParallel))
+    finally:
+        search.quit()
+    return totalSerial / totalParallel
+
+
+def main(argv=None):
+    from Engine.perft import POSITIONS
+    parser = argparse.ArgumentParser(prog="python -m AI.parallel",
+                                     description="Speedup of the parallel search over a single process")
+    parser.add_argument("--workers", type=int, default=max(2, config.SEARCH_WORKERS),
+                        help="helper processes of the parallel search")
+    parser.add_argument("--depth", type=int, default=4, help="search depth (default 4)")
+    parser.add_argument("--backend", choices=("array", "bitboard"), default=config.ENGINE_BACKEND)
+    parser.add_argument("--position", choices=sorted(POSITIONS), action="append",
+                        help="perft position to search, can be repeated (default: all)")
+    args = parser.parse_args(argv)
+    fens = {name: POSITIONS[name][0] for name in (args.position or POSITIONS)}
+    runBenchmark(fens, args.workers, args.depth, args.backend)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
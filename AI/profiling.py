@@ -0,0 +1,194 @@
+"""
+Opt-in profiling of the engine, per AI move.
+
+Two tools, both off unless asked for (config.PROFILE_DIR / config.PROFILE_TIMERS, which the
+CHESS_PROFILE and CHESS_PROFILE_TIMERS environment variables or main.py --profile / --profile-timers set):
+    SearchProfiler   runs every search of the engine worker under cProfile and writes its pstats to
+                     <directory>/<session>-move-<n>.prof (read it with pstats or snakeviz)
+    SubsystemTimers  times the engine's hot paths (move generation, pin and check detection,
+                     make/undo and the evaluation, see TIMED_METHODS) and writes where the time went
+                     as collapsed stacks to <directory>/<session>-move-<n>.collapsed, one
+                     "search;getValidMoves;checkForPinsAndChecks <microseconds>" line per call path
+                     (the input of flamegraph.pl and speedscope)
+The timers wrap the engine methods only while they are installed, so when they are off the engine
+runs its own methods and pays nothing for them. With a parallel search only the worker process
+is profiled, not its helpers.
+
+Usage (from the project root), to profile one position without the GUI:
+    python -m AI.profiling --fen "<FEN>" --depth 5 --timers --out profiles
+"""
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import time
+
+import config
+from Engine.gameState import GameState, createGameState
+from Engine.bitboardState import BitboardGameState
+from . import evaluation, moveFinder
+
+# Timer name -> the engine methods it times (on both backends, where they exist)
+TIMED_METHODS = {
+    "getValidMoves": ("getValidMoves", "getValidMoveCodes", "getTacticalMoveCodes", "getEvasionCodes",
+                      "getCaptureMoveCodes", "getQuietMoveCodes", "getSquareMoveCodes"),
+    "checkForPinsAndChecks": ("checkForPinsAndChecks", "findChecksAndPins"),
+    "makeMove": ("makeMove", "makeMoveCode", "makeNullMove"),
+    "undoMove": ("undoMove", "undoNullMove"),
+}
+TIMED_CLASSES = (GameState, BitboardGameState)
+# Modules that hold a reference to scoreBoard, so it is timed wherever it is called from
+SCORE_BOARD_MODULES = (evaluation, moveFinder)
+
+
+"""
+Timers around the engine's hot paths, keeping the time spent per call path (nested timers
+included, e.g. checkForPinsAndChecks inside getValidMoves) as exclusive time.
+install() wraps the methods, uninstall() puts the originals back; start() begins a new measurement
+under a root frame (e.g. "search") and writeCollapsed() ends it.
+"""
+class SubsystemTimers:
+    def __init__(self):
+        self.installed = []  # (owner, attribute, original) of every wrapped function
+        self.start()
+
+    def start(self, root="search"):
+        # frames of the timers running: [name, start time, time spent in timers below it]
+        self.stack = [[root, time.perf_counter(), 0.0]]
+        self.selfTimes = {}  # call path (tuple of timer names) -> seconds spent in it, not below it
+        self.calls = {}  # timer name -> calls
+
+    def install(self):
+        if self.installed:
+            return
+        for timerName, methods in TIMED_METHODS.items():
+            for cls in TIMED_CLASSES:
+                for method in methods:
+                    if method in cls.__dict__:
+                        self.wrap(cls, method, timerName)
+        for module in SCORE_BOARD_MODULES:
+            self.wrap(module, "scoreBoard", "scoreBoard")
+
+    def uninstall(self):
+        for owner, attribute, original in reversed(self.installed):
+            setattr(owner, attribute, original)
+        self.installed = []
+
+    def wrap(self, owner, attribute, timerName):
+        original = vars(owner)[attribute]  # the class's own method, not an inherited one
+        self.installed.append((owner, attribute, original))
+        setattr(owner, attribute, self.timed(timerName, original))
+
+    # Returns `function` timed under `name`; a call inside a call of the same timer (an override
+    # calling the base class method) counts as part of the outer one
+    def timed(self, name, function):
+        def timedFunction(*args, **kwargs):
+            stack = self.stack
+            if stack[-1][0] == name:
+                return function(*args, **kwargs)
+            frame = [name, time.perf_counter(), 0.0]
+            stack.append(frame)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - frame[1]
+                path = tuple(entry[0] for entry in stack)
+                stack.pop()
+                stack[-1][2] += elapsed
+                self.selfTimes[path] = self.selfTimes.get(path, 0.0) + elapsed - frame[2]
+                self.calls[name] = self.calls.get(name, 0) + 1
+        timedFunction.__name__ = getattr(function, "__name__", name)
+        timedFunction.__wrapped__ = function
+        return timedFunction
+
+    # Ends the measurement: the time not spent in any timer goes to the root frame
+    def stop(self):
+        root = self.stack[0]
+        elapsed = time.perf_counter() - root[1]
+        self.selfTimes[(root[0],)] = self.selfTimes.get((root[0],), 0.0) + elapsed - root[2]
+
+    # Total (inclusive) seconds per timer name
+    def totals(self):
+        totals = {}
+        for path, seconds in self.selfTimes.items():
+            for name in set(path[1:]):
+                totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def writeCollapsed(self, path):
+        self.stop()
+        with open(path, "w") as file:
+            for stack, seconds in sorted(self.selfTimes.items()):
+                file.write("{} {}\n".format(";".join(stack), int(seconds * 1e6)))
+
+
+"""
+Profiles the searches of one engine process, one set of files per search in `directory`
+(created if needed): cProfile's pstats always, the collapsed stacks of SubsystemTimers if `timers`.
+"""
+class SearchProfiler:
+    def __init__(self, directory, timers=False):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        # files of one run share a prefix, so a new run doesn't overwrite the last one
+        self.session = time.strftime("%Y%m%d-%H%M%S") + "-" + str(os.getpid())
+        self.searches = 0
+        self.timers = SubsystemTimers() if timers else None
+        if self.timers is not None:
+            self.timers.install()
+
+    # Calls function(*args, **kwargs) under the profiler, writes the files and returns what it returned
+    def profile(self, function, *args, **kwargs):
+        self.searches += 1
+        base = os.path.join(self.directory, "{}-move-{:03d}".format(self.session, self.searches))
+        profiler = cProfile.Profile()
+        if self.timers is not None:
+            self.timers.start()
+        try:
+            return profiler.runcall(function, *args, **kwargs)
+        finally:
+            profiler.dump_stats(base + ".prof")
+            if self.timers is not None:
+                self.timers.writeCollapsed(base + ".collapsed")
+
+    def close(self):
+        if self.timers is not None:
+            self.timers.uninstall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m AI.profiling",
+                                     description="Profile the AI's search of one position")
+    parser.add_argument("--fen", help="position to search (default: the initial position)")
+    parser.add_argument("--depth", type=int, default=4, help="search depth (default 4)")
+    parser.add_argument("--time", type=float, help="time limit in seconds instead of a fixed depth")
+    parser.add_argument("--backend", choices=("array", "bitboard"), default=config.ENGINE_BACKEND)
+    parser.add_argument("--timers", action="store_true", help="also time the engine's hot paths")
+    parser.add_argument("--out", default=config.PROFILE_DIR or "profiles",
+                        help="directory for the profile files (default: profiles)")
+    parser.add_argument("--top", type=int, default=20, help="functions to print (default 20)")
+    args = parser.parse_args(argv)
+
+    gs = createGameState(args.backend, args.fen)
+    profiler = SearchProfiler(args.out, args.timers)
+    try:
+        result = profiler.profile(moveFinder.Searcher().search, gs, depth=None if args.time else args.depth,
+                                  timeLimit=args.time)
+    finally:
+        profiler.close()
+    base = os.path.join(args.out, "{}-move-{:03d}".format(profiler.session, profiler.searches))
+    print("depth {}, {:,} nodes in {:.2f}s, line: {}".format(result.depth, result.nodes, result.elapsed,
+                                                            moveFinder.formatVariation(gs, result.pv)))
+    pstats.Stats(base + ".prof").sort_stats("tottime").print_stats(args.top)
+    if profiler.timers is not None:
+        print("{:<24} {:>10} {:>8}".format("subsystem", "calls", "seconds"))
+        totals = profiler.timers.totals()
+        for name in sorted(totals, key=totals.get, reverse=True):
+            print("{:<24} {:>10,} {:>8.3f}".format(name, profiler.timers.calls[name], totals[name]))
+    print("written:", base + ".prof" + (", " + base + ".collapsed" if profiler.timers is not None else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
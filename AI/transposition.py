@@ -0,0 +1,275 @@
+from array import array
+from multiprocessing import shared_memory
+import os
+import struct
+
+"""
+Fixed-size transposition table.
+Entries live in three flat arrays instead of one dict per position, so the memory use is set once
+(in MB) and never grows:
+    keys[i]   the 64-bit Zobrist key of the position (to tell apart positions sharing a bucket)
+    scores[i] the score (a float, like the evaluation)
+    info[i]   best move | flag << 17 | depth << 19 | age << 27, 0 for an empty slot
+Positions are mapped to buckets of two slots by the low bits of their key:
+the first slot keeps the deepest result (it is only replaced by an equal or deeper search of any
+position, or by anything once it is left over from an earlier search), the second is always replaced.
+"""
+
+# Bound types of a stored score
+EXACT = 1
+LOWER_BOUND = 2  # the search failed high, the real score is at least this
+UPPER_BOUND = 3  # the search failed low, the real score is at most this
+
+BUCKET_SIZE = 2
+ENTRY_BYTES = 8 + 8 + 8  # key, score, info
+
+MOVE_MASK = (1 << 17) - 1
+FLAG_SHIFT = 17
+DEPTH_SHIFT = 19
+AGE_SHIFT = 27
+
+# Header words of a shared table
+HEADER_MAGIC = 0
+HEADER_CAPACITY = 1
+HEADER_AGE = 2
+HEADER_BYTES = 4 * 8
+SHARED_TABLE_MAGIC = 0x5454534843  # "CHSTT"
+# Buckets a shared table counts to estimate how full it is (positions spread evenly over the buckets)
+FILL_SAMPLE_BUCKETS = 1000
+
+_DOUBLE = struct.Struct("<d")
+_QWORD = struct.Struct("<Q")
+
+def scoreToBits(score):
+    return _QWORD.unpack(_DOUBLE.pack(score))[0]
+
+def bitsToScore(bits):
+    return _DOUBLE.unpack(_QWORD.pack(bits))[0]
+
+def attachSharedMemory(name):
+    try:
+        # Python 3.13+: the attaching process must not free the memory when it exits
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Older versions track it anyway; children of the owner share its tracker, so that is harmless there
+        return shared_memory.SharedMemory(name=name)
+
+
+class TranspositionTable:
+    def __init__(self, sizeMB=16):
+        # the number of buckets is a power of two so the index is just a mask of the key
+        buckets = 1
+        while buckets * 2 * BUCKET_SIZE * ENTRY_BYTES <= sizeMB * 1024 * 1024:
+            buckets *= 2
+        self.mask = buckets - 1
+        self.capacity = buckets * BUCKET_SIZE
+        self.keys = array("Q", bytes(8 * self.capacity))
+        self.scores = array("d", bytes(8 * self.capacity))
+        self.info = array("Q", bytes(8 * self.capacity))
+        self.age = 0
+        self.used = 0  # slots holding an entry
+        self.resetStats()
+
+    # Hits and probes are counted by the search (Searcher.ttProbes/ttHits), the rest here
+    def resetStats(self):
+        self.collisions = 0  # probes that found the bucket full of other positions
+        self.stores = 0
+        self.overwrites = 0  # stores that threw away another position
+
+    def clear(self):
+        self.keys = array("Q", bytes(8 * self.capacity))
+        self.scores = array("d", bytes(8 * self.capacity))
+        self.info = array("Q", bytes(8 * self.capacity))
+        self.age = 0
+        self.used = 0
+        self.resetStats()
+
+    # Called once per search: entries of earlier searches become the first to be replaced
+    def newSearch(self):
+        self.age = (self.age + 1) & 0xFF
+
+    """
+    Looks the position up. Returns (score, depth, flag, move) or None if it isn't stored;
+    move is None when the entry has no best move.
+    """
+    def probe(self, key):
+        i = (key & self.mask) * BUCKET_SIZE
+        keys = self.keys
+        info = self.info
+        for slot in (i, i + 1):
+            if keys[slot] == key and info[slot]:
+                entry = info[slot]
+                return (self.scores[slot], (entry >> DEPTH_SHIFT) & 0xFF, (entry >> FLAG_SHIFT) & 3,
+                        (entry & MOVE_MASK) or None)
+        if info[i] and info[i + 1]:
+            self.collisions += 1
+        return None
+
+    def store(self, key, score, depth, flag, move):
+        self.stores += 1
+        i = (key & self.mask) * BUCKET_SIZE
+        keys = self.keys
+        info = self.info
+        first = info[i]
+        # a position already stored is updated where it is, so it is never in the bucket twice
+        if keys[i + 1] == key and info[i + 1]:
+            slot = i + 1
+        elif keys[i] == key or not first or (first >> AGE_SHIFT) != self.age or depth >= (first >> DEPTH_SHIFT) & 0xFF:
+            slot = i
+        else:
+            slot = i + 1
+
+        old = info[slot]
+        if not old:
+            self.used += 1
+        elif keys[slot] == key:
+            # a search that found no best move keeps the one found before
+            if move is None:
+                move = (old & MOVE_MASK) or None
+        else:
+            self.overwrites += 1
+
+        keys[slot] = key
+        self.scores[slot] = score
+        info[slot] = (move or 0) | (flag << FLAG_SHIFT) | (depth << DEPTH_SHIFT) | (self.age << AGE_SHIFT)
+
+    def fillRate(self):
+        return self.used / self.capacity
+
+    def stats(self):
+        used = self.used
+        return {
+            "sizeMB": self.capacity * ENTRY_BYTES / (1024 * 1024),
+            "entries": self.capacity,
+            "used": used,
+            "fillRate": used / self.capacity,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+        }
+
+
+"""
+Transposition table in shared memory, so several processes (the helpers of AI/parallel.py, analysis
+pools, ...) search with one table instead of each finding the same positions again.
+Same interface and replacement scheme as TranspositionTable. The owner creates it with a size;
+other processes attach to it by its name:
+    table = SharedTranspositionTable(16)                 # owner
+    table = SharedTranspositionTable(name=table.name)    # any other process
+    searcher = moveFinder.Searcher(table)
+Writers don't lock: every slot is three 64-bit words, (key ^ score ^ info, score, info), and a probe
+only accepts a slot whose first word XORed with the other two gives back its key. A slot that another
+process was halfway through writing fails that check and reads as a miss.
+The whole table (header and slots) can be saved to a file and loaded again by a table of the same size.
+"""
+class SharedTranspositionTable(TranspositionTable):
+    def __init__(self, sizeMB=16, name=None):
+        if name is None:
+            buckets = 1
+            while buckets * 2 * BUCKET_SIZE * ENTRY_BYTES <= sizeMB * 1024 * 1024:
+                buckets *= 2
+            capacity = buckets * BUCKET_SIZE
+            self.memory = shared_memory.SharedMemory(create=True, size=HEADER_BYTES + capacity * ENTRY_BYTES)
+            self.owner = True
+        else:
+            self.memory = attachSharedMemory(name)
+            self.owner = False
+        self.name = self.memory.name
+        self.size = self.memory.size
+        self.header = self.memory.buf[:HEADER_BYTES].cast("Q")
+        self.slots = self.memory.buf[HEADER_BYTES:].cast("Q")
+        if self.owner:
+            self.header[HEADER_MAGIC] = SHARED_TABLE_MAGIC
+            self.header[HEADER_CAPACITY] = capacity
+        self.capacity = self.header[HEADER_CAPACITY]
+        self.mask = self.capacity // BUCKET_SIZE - 1
+        self.resetStats()
+
+    # The age lives in the header, so one newSearch counts for every process using the table
+    @property
+    def age(self):
+        return self.header[HEADER_AGE]
+
+    def newSearch(self):
+        self.header[HEADER_AGE] = (self.header[HEADER_AGE] + 1) & 0xFF
+
+    # Slots holding an entry. Stores from other processes can't be tracked and counting every slot after
+    # each search would take too long, so it is estimated from the first FILL_SAMPLE_BUCKETS buckets
+    @property
+    def used(self):
+        infos = self.slots[2:FILL_SAMPLE_BUCKETS * BUCKET_SIZE * 3:3]
+        return (len(infos) - infos.tolist().count(0)) * self.capacity // len(infos)
+
+    def clear(self):
+        self.slots[:] = array("Q", bytes(8 * len(self.slots)))
+        self.header[HEADER_AGE] = 0
+        self.resetStats()
+
+    def probe(self, key):
+        slots = self.slots
+        base = (key & self.mask) * BUCKET_SIZE * 3
+        for slot in (base, base + 3):
+            entry = slots[slot + 2]
+            if entry:
+                scoreBits = slots[slot + 1]
+                if slots[slot] ^ scoreBits ^ entry == key:
+                    return (bitsToScore(scoreBits), (entry >> DEPTH_SHIFT) & 0xFF, (entry >> FLAG_SHIFT) & 3,
+                            (entry & MOVE_MASK) or None)
+        if slots[base + 2] and slots[base + 5]:
+            self.collisions += 1
+        return None
+
+    def store(self, key, score, depth, flag, move):
+        self.stores += 1
+        slots = self.slots
+        age = self.header[HEADER_AGE]
+        slot = (key & self.mask) * BUCKET_SIZE * 3
+        first = slots[slot + 2]
+        second = slots[slot + 5]
+        if second and slots[slot + 3] ^ slots[slot + 4] ^ second == key:
+            slot += 3
+        elif (first and slots[slot] ^ slots[slot + 1] ^ first != key and (first >> AGE_SHIFT) == age and
+                depth < (first >> DEPTH_SHIFT) & 0xFF):
+            slot += 3
+
+        old = slots[slot + 2]
+        if old:
+            if slots[slot] ^ slots[slot + 1] ^ old == key:
+                if move is None:
+                    move = (old & MOVE_MASK) or None
+            else:
+                self.overwrites += 1
+
+        entry = (move or 0) | (flag << FLAG_SHIFT) | (depth << DEPTH_SHIFT) | (age << AGE_SHIFT)
+        scoreBits = scoreToBits(score)
+        slots[slot + 2] = entry
+        slots[slot + 1] = scoreBits
+        slots[slot] = key ^ scoreBits ^ entry
+
+    # Written to a temporary file that then replaces `path`, so an interrupted save leaves the old file
+    def save(self, path):
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(self.memory.buf[:self.size])
+        os.replace(temporary, path)
+
+    """
+    Fills the table from a file written by save.
+    Raises ValueError if the file is not a saved table of this size.
+    """
+    def load(self, path):
+        with open(path, "rb") as file:
+            data = file.read()
+        if len(data) != self.size or struct.unpack_from("<2Q", data) != (SHARED_TABLE_MAGIC, self.capacity):
+            raise ValueError("Not a saved transposition table of this size: " + path)
+        self.memory.buf[:self.size] = data
+        self.resetStats()
+
+    # Detaches from the table; the owner also frees it, after which no process can attach any more
+    def close(self):
+        self.header.release()
+        self.slots.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
@@ -0,0 +1,221 @@
+from multiprocessing import Process, Queue, Value
+import atexit
+import os
+import queue
+import time
+
+import config
+from Engine.gameState import createGameState
+from .moveFinder import Searcher, findOpeningMove
+from .transposition import SharedTranspositionTable
+
+# Seconds EngineWorker.quit waits for the worker to finish quitting before it terminates it
+QUIT_TIMEOUT = 30
+
+"""
+A long-lived engine process, started once per GUI session instead of once per AI move.
+It keeps its own GameState and Searcher (transposition table, history, ...) in memory between
+moves, so every search starts warm and nothing but a few small tuples crosses the process boundary.
+
+Commands, put on the command queue by EngineWorker:
+    ("newgame",)                     start over from the initial position and forget the tables
+    ("position", fen, moveCodes)     the game: a start FEN (None = initial position) and the packed
+                                     codes of the moves played since; only the moves that differ from
+                                     the worker's own game are taken back / played
+    ("go", searchId, limits)         search the current position with the given limits
+                                     (keyword arguments of moveFinder.Searcher.search), on
+                                     `workers` processes if that is more than one (see AI/parallel.py)
+    ("quit",)                        save the table (config.TT_FILE) and exit
+Results, on the result queue:
+    ("bestmove", searchId, moveCode, pv, stats)  moveCode is None if the search found nothing,
+                                                 pv is the principal variation (list of move codes),
+                                                 stats what the search cost (see moveFinder.searchStats,
+                                                 empty for a book move)
+    ("quit",)                                    the worker has saved everything and is exiting
+With a profile directory every search is profiled into it (see AI/profiling.py).
+Stopping can't go through the command queue (the worker doesn't read it while it searches), so
+EngineWorker.stop writes the id of the last search to stop into a shared counter that the search polls.
+"""
+
+
+"""
+Brings gs to the game given by a start FEN (None = initial position) and the codes of the moves
+played since: the moves both games share are kept, the rest are taken back and the new ones played.
+Returns the GameState to go on with, a new one if the start position is not the one gs started from.
+"""
+def syncGame(gs, startFEN, fen, moveCodes, backend):
+    if fen != startFEN:
+        gs = createGameState(backend, fen)
+    common = 0
+    while common < len(moveCodes) and common < len(gs.moveLog) and gs.moveLog[common] == moveCodes[common]:
+        common += 1
+    while len(gs.moveLog) > common:
+        gs.undoMove()
+    for code in moveCodes[common:]:
+        gs.makeMoveCode(code)
+    return gs
+
+
+def runWorker(commands, results, stoppedSearch, backend, workers=1, profileDir=None, profileTimers=False):
+    gs = createGameState(backend)
+    startFEN = None
+    profiler = None
+    if profileDir is not None:
+        # imported here so a worker that doesn't profile never loads it
+        from .profiling import SearchProfiler
+        profiler = SearchProfiler(profileDir, profileTimers)
+    # with more than one worker the searches are split over helper processes (AI/parallel.py)
+    parallelSearch = None
+    # the parallel search and a table kept on disk need the table in shared memory
+    table = None
+    if workers > 1 or config.TT_FILE is not None:
+        table = SharedTranspositionTable(config.TT_SIZE_MB)
+        if config.TT_FILE is not None and os.path.exists(config.TT_FILE):
+            try:
+                table.load(config.TT_FILE)
+            except ValueError:
+                pass  # saved with another size, start empty
+    searcher = Searcher(table)
+
+    while True:
+        command = commands.get()
+        kind = command[0]
+
+        if kind == "quit":
+            if parallelSearch is not None:
+                parallelSearch.quit()
+            if config.TT_FILE is not None:
+                table.save(config.TT_FILE)
+            if table is not None:
+                table.close()
+            if profiler is not None:
+                profiler.close()
+            results.put(("quit",))
+            break
+
+        elif kind == "newgame":
+            gs = createGameState(backend)
+            startFEN = None
+            searcher.newGame()
+
+        elif kind == "position":
+            _, fen, moveCodes = command
+            gs = syncGame(gs, startFEN, fen, moveCodes, backend)
+            startFEN = fen
+
+        elif kind == "go":
+            _, searchId, limits = command
+            openingMove = findOpeningMove(gs)
+            if openingMove is not None:
+                print("Playing from Opening Book (Napoleon's Plan)!")
+                results.put(("bestmove", searchId, openingMove.code, [openingMove.code], {}))
+                continue
+            stopRequested = lambda: stoppedSearch.value >= searchId
+            if workers > 1:
+                if parallelSearch is None:
+                    # imported here: AI.parallel imports this module
+                    from .parallel import ParallelSearch
+                    parallelSearch = ParallelSearch(workers, backend, table)
+                parallelSearch.stopRequested = stopRequested
+                search = parallelSearch.search
+                limits = dict(limits, startFEN=startFEN)
+            else:
+                searcher.stopRequested = stopRequested
+                search = searcher.search
+            if profiler is not None:
+                result = profiler.profile(search, gs, **limits)
+            else:
+                result = search(gs, **limits)
+            results.put(("bestmove", searchId, result.bestMove, result.pv, result.stats))
+
+
+"""
+The GUI side of the worker: starts the process and wraps the command/result queues.
+"""
+class EngineWorker:
+    def __init__(self, backend=config.ENGINE_BACKEND, workers=config.SEARCH_WORKERS,
+                 profileDir=config.PROFILE_DIR, profileTimers=config.PROFILE_TIMERS):
+        self.commands = Queue()
+        self.results = Queue()
+        # id of the last search that was told to stop (search ids start at 1)
+        self.stoppedSearch = Value("q", 0)
+        self.lastSearchId = 0
+        # principal variation of the last search answered (move codes from the position searched)
+        self.principalVariation = []
+        # stats of the last search answered (see moveFinder.searchStats)
+        self.stats = {}
+        self.process = Process(target=runWorker,
+                               args=(self.commands, self.results, self.stoppedSearch, backend, workers,
+                                     profileDir, profileTimers))
+        # a daemon process can't start the helpers of a parallel search; then the worker is shut down
+        # at exit instead, before multiprocessing waits for it
+        self.process.daemon = workers <= 1
+        if not self.process.daemon:
+            atexit.register(self.quit)
+        self.process.start()
+
+    def newGame(self):
+        self.stop()
+        self.commands.put(("newgame",))
+
+    def setPosition(self, moveCodes, fen=None):
+        self.commands.put(("position", fen, list(moveCodes)))
+
+    # Starts a search of the position last set, returns its id
+    def go(self, limits):
+        self.lastSearchId += 1
+        self.commands.put(("go", self.lastSearchId, dict(limits)))
+        return self.lastSearchId
+
+    # Asks the running search (if any) to return as soon as possible
+    def stop(self):
+        self.stoppedSearch.value = self.lastSearchId
+
+    """
+    Returns the move code found by search `searchId` (None if it found nothing).
+    Blocks until it is there; results of older searches are dropped on the way. A search that was
+    stopped still answers, with the best move it had found.
+    The principal variation and stats of the search are left in self.principalVariation and self.stats.
+    """
+    def waitForMove(self, searchId):
+        while True:
+            _, resultId, moveCode, pv, stats = self.results.get()
+            if resultId == searchId:
+                self.principalVariation = pv
+                self.stats = stats
+                return moveCode
+
+    """
+    Non-blocking version of waitForMove for the GUI loop:
+    returns (True, moveCode) once search `searchId` has answered, otherwise (False, None).
+    Unlike waitForMove, the results of stopped searches are discarded: the GUI stops a search when the
+    position changed under it, so its move is no use any more.
+    """
+    def pollMove(self, searchId):
+        while True:
+            try:
+                _, resultId, moveCode, pv, stats = self.results.get_nowait()
+            except queue.Empty:
+                return False, None
+            if resultId == searchId and resultId > self.stoppedSearch.value:
+                self.principalVariation = pv
+                self.stats = stats
+                return True, moveCode
+
+    def quit(self):
+        if not self.process.is_alive():
+            return
+        self.stop()
+        self.commands.put(("quit",))
+        # saving a large table can take a while: wait for the worker to say it is done before
+        # terminating it, which would leave half a file behind
+        deadline = time.monotonic() + QUIT_TIMEOUT
+        while self.process.is_alive() and time.monotonic() < deadline:
+            try:
+                if self.results.get(timeout=0.1)[0] == "quit":
+                    break
+            except queue.Empty:
+                pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
@@ -0,0 +1,450 @@
+from .gameState import GameState
+from .tables import (
+    DIRECTIONS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS,
+    RAYS, BETWEEN, LINE_THROUGH,
+)
+from .move import ENPASSANT_FLAG, CASTLE_FLAG, PROMOTION_FLAG, PROMOTION_PIECES, PROMOTION_SHIFT, NULL_MOVE
+
+"""
+Bitboard backend for the GameState.
+Each of the twelve pieces has a 64-bit integer with one bit per square (bit = row * 8 + col,
+so bit 0 is a8 and bit 63 is h1), plus one occupancy board per color and one for the whole board.
+Move generation works on whole sets of squares at once instead of testing squares one by one.
+The 8x8 `board` list is still kept up to date (by GameState.makeMove/undoMove) because the GUI,
+the evaluation and Move objects read it.
+"""
+
+PIECES = ["wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK"]
+
+
+def slidingAttacks(sq, occupied, directions):
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if d < 4:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[d][first]
+        attacks |= ray
+    return attacks
+
+def bishopAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, BISHOP_DIRECTIONS)
+
+def rookAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, ROOK_DIRECTIONS)
+
+
+class BitboardGameState(GameState):
+    def __init__(self):
+        super().__init__()
+        # checkers bitboard and {pinned square: line} of the position, set by prepareMoveGeneration
+        self.checkers = 0
+        self.pinLines = {}
+        self.initBitboards()
+
+    def initBitboards(self):
+        self.pieceBoards = {piece: 0 for piece in PIECES}
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    self.pieceBoards[piece] |= 1 << (r * 8 + c)
+        self.occupancy = {"w": 0, "b": 0}
+        for piece in PIECES:
+            self.occupancy[piece[0]] |= self.pieceBoards[piece]
+        self.allOccupancy = self.occupancy["w"] | self.occupancy["b"]
+        self.attackMap = None
+
+    def setFEN(self, fen):
+        super().setFEN(fen)
+        self.initBitboards()
+
+    def makeMoveCode(self, code):
+        startSq = code & 63
+        endSq = (code >> 6) & 63
+        pieceMoved = self.board[startSq >> 3][startSq & 7]
+        if code & ENPASSANT_FLAG:
+            pieceCaptured = self.board[startSq >> 3][endSq & 7]
+        else:
+            pieceCaptured = self.board[endSq >> 3][endSq & 7]
+        self.toggleBitboards(code, pieceMoved, pieceCaptured)
+        super().makeMoveCode(code)
+
+    def undoMove(self):
+        if len(self.moveLog) != 0:
+            code = self.moveLog[-1]
+            pieceCaptured = self.captureLog[-1]
+            super().undoMove()
+            if code != NULL_MOVE:
+                startSq = code & 63
+                self.toggleBitboards(code, self.board[startSq >> 3][startSq & 7], pieceCaptured)
+
+    def hasNonPawnMaterial(self):
+        color = "w" if self.whiteToMove else "b"
+        boards = self.pieceBoards
+        return bool(boards[color + "N"] | boards[color + "B"] | boards[color + "R"] | boards[color + "Q"])
+
+    """
+    XORs the squares a move touches into the piece and occupancy boards.
+    XOR is its own inverse, so the same call both makes and takes back the move.
+    """
+    def toggleBitboards(self, code, pieceMoved, pieceCaptured):
+        boards = self.pieceBoards
+        color = pieceMoved[0]
+        startSq = code & 63
+        endSq = (code >> 6) & 63
+        startBit = 1 << startSq
+        endBit = 1 << endSq
+
+        boards[pieceMoved] ^= startBit
+        if code & PROMOTION_FLAG:
+            boards[color + PROMOTION_PIECES[code >> PROMOTION_SHIFT]] ^= endBit
+        else:
+            boards[pieceMoved] ^= endBit
+        self.occupancy[color] ^= startBit | endBit
+
+        if pieceCaptured != "--":
+            enemy = pieceCaptured[0]
+            if code & ENPASSANT_FLAG:
+                capturedBit = 1 << ((startSq & ~7) | (endSq & 7))
+            else:
+                capturedBit = endBit
+            boards[pieceCaptured] ^= capturedBit
+            self.occupancy[enemy] ^= capturedBit
+
+        if code & CASTLE_FLAG:
+            if endSq > startSq:
+                rookBits = (1 << (endSq + 1)) | (1 << (endSq - 1))
+            else:
+                rookBits = (1 << (endSq - 2)) | (1 << (endSq + 1))
+            boards[color + "R"] ^= rookBits
+            self.occupancy[color] ^= rookBits
+
+        self.allOccupancy = self.occupancy["w"] | self.occupancy["b"]
+
+    """
+    All pieces of `color` that attack square sq, given the occupancy `occupied`.
+    """
+    def attackersOf(self, sq, color, occupied):
+        boards = self.pieceBoards
+        enemy = "b" if color == "w" else "w"
+        queens = boards[color + "Q"]
+        return (
+            (KNIGHT_ATTACKS[sq] & boards[color + "N"])
+            | (KING_ATTACKS[sq] & boards[color + "K"])
+            | (PAWN_ATTACKS[enemy][sq] & boards[color + "p"])
+            | (bishopAttacks(sq, occupied) & (boards[color + "B"] | queens))
+            | (rookAttacks(sq, occupied) & (boards[color + "R"] | queens))
+        )
+
+    def leastValuableAttacker(self, sq, color, removed):
+        occupied = self.allOccupancy & ~removed
+        attackers = self.attackersOf(sq, color, occupied) & occupied
+        if attackers:
+            boards = self.pieceBoards
+            # the lowest square of the first kind found, as in GameState.leastValuableAttacker
+            for kind in "pNBRQK":
+                found = attackers & boards[color + kind]
+                if found:
+                    return (found & -found).bit_length() - 1, kind
+        return None
+
+    """
+    Bitboard of every square the opponent of the side to move attacks, with our own king taken
+    off the board so the squares behind it on a checking line count as attacked too.
+    Cached until the next makeMove/undoMove (GameState resets attackMap).
+    """
+    def getAttackMap(self):
+        if self.attackMap is not None:
+            return self.attackMap
+        boards = self.pieceBoards
+        ally = "w" if self.whiteToMove else "b"
+        enemy = "b" if self.whiteToMove else "w"
+        occupied = self.allOccupancy ^ boards[ally + "K"]
+        attacks = 0
+        for piece, table in (("p", PAWN_ATTACKS[enemy]), ("N", KNIGHT_ATTACKS), ("K", KING_ATTACKS)):
+            pieces = boards[enemy + piece]
+            while pieces:
+                bit = pieces & -pieces
+                pieces ^= bit
+                attacks |= table[bit.bit_length() - 1]
+        for piece, directions in (("B", BISHOP_DIRECTIONS), ("R", ROOK_DIRECTIONS), ("Q", range(8))):
+            pieces = boards[enemy + piece]
+            while pieces:
+                bit = pieces & -pieces
+                pieces ^= bit
+                attacks |= slidingAttacks(bit.bit_length() - 1, occupied, directions)
+        self.attackMap = attacks
+        return attacks
+
+    """
+    Finds the checkers of the side to move and its pinned pieces.
+    Returns (checkers bitboard, {pinned square: line the piece may still move on}).
+    Also fills inCheck/checks/pins in the same format as the array backend.
+    """
+    def findChecksAndPins(self):
+        ally = "w" if self.whiteToMove else "b"
+        enemy = "b" if self.whiteToMove else "w"
+        boards = self.pieceBoards
+        kingSq = (boards[ally + "K"] & -boards[ally + "K"]).bit_length() - 1
+        kingRow, kingCol = kingSq >> 3, kingSq & 7
+        checkers = self.attackersOf(kingSq, enemy, self.allOccupancy)
+
+        pinLines = {}
+        pins = []
+        queens = boards[enemy + "Q"]
+        diagonalSliders = boards[enemy + "B"] | queens
+        straightSliders = boards[enemy + "R"] | queens
+        ownPieces = self.occupancy[ally]
+        for d in range(8):
+            sliders = straightSliders if d in ROOK_DIRECTIONS else diagonalSliders
+            if not RAYS[d][kingSq] & sliders:
+                continue
+            blockers = RAYS[d][kingSq] & self.allOccupancy
+            if d < 4:
+                first = blockers & -blockers
+                rest = blockers ^ first
+                second = rest & -rest
+            else:
+                first = 1 << (blockers.bit_length() - 1)
+                rest = blockers ^ first
+                second = 1 << (rest.bit_length() - 1) if rest else 0
+            if first & ownPieces and second & sliders:
+                pinnedSq = first.bit_length() - 1
+                pinLines[pinnedSq] = LINE_THROUGH[kingSq][pinnedSq]
+                pins.append((pinnedSq >> 3, pinnedSq & 7, DIRECTIONS[d][0], DIRECTIONS[d][1]))
+
+        checks = []
+        rest = checkers
+        while rest:
+            bit = rest & -rest
+            rest ^= bit
+            sq = bit.bit_length() - 1
+            dr, dc = (sq >> 3) - kingRow, (sq & 7) - kingCol
+            if self.board[sq >> 3][sq & 7][1] != "N":
+                dr, dc = (dr > 0) - (dr < 0), (dc > 0) - (dc < 0)
+            checks.append((sq >> 3, sq & 7, dr, dc))
+
+        self.inCheck = checkers != 0
+        self.pins = pins
+        self.checks = checks
+        return checkers, pinLines
+
+    def getValidMoveCodes(self):
+        moves = []
+        boards = self.pieceBoards
+        ally = "w" if self.whiteToMove else "b"
+        enemy = "b" if self.whiteToMove else "w"
+        ownPieces = self.occupancy[ally]
+        enemyPieces = self.occupancy[enemy]
+        occupied = self.allOccupancy
+        kingSq = (boards[ally + "K"] & -boards[ally + "K"]).bit_length() - 1
+
+        checkers, pinLines = self.findChecksAndPins()
+
+        # King moves: anywhere the enemy does not attack
+        self.addMoves(kingSq, KING_ATTACKS[kingSq] & ~ownPieces & ~self.getAttackMap(), moves)
+
+        if checkers:
+            # with two checkers only the king can move
+            if checkers & (checkers - 1) == 0:
+                self.getCheckEvasions(ally, enemy, kingSq, checkers, pinLines, moves)
+        else:
+            self.getPieceMoves(ally, enemy, ownPieces, enemyPieces, occupied, kingSq, pinLines, moves)
+            self.getCastleMoves(kingSq >> 3, kingSq & 7, moves)
+
+        if len(moves) == 0:
+            if self.inCheck:
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        else:
+            self.checkmate = False
+            self.stalemate = self.repetitions.isRepetition()
+        return moves
+
+    """
+    Moves of the pieces other than the king, when not in check.
+    `captures`/`quiets` pick which half to generate (promotions count as captures) and `fromMask`
+    limits it to the pieces on those squares; the staged generators below use them.
+    """
+    def getPieceMoves(self, ally, enemy, ownPieces, enemyPieces, occupied, kingSq, pinLines, moves,
+                      captures=True, quiets=True, fromMask=-1):
+        boards = self.pieceBoards
+        empty = ~occupied
+        targetMask = (enemyPieces if captures else 0) | (empty if quiets else 0)
+
+        # Knights (a pinned knight can never move)
+        knights = boards[ally + "N"] & fromMask
+        while knights:
+            bit = knights & -knights
+            knights ^= bit
+            sq = bit.bit_length() - 1
+            if sq in pinLines:
+                continue
+            self.addMoves(sq, KNIGHT_ATTACKS[sq] & targetMask, moves)
+
+        # Sliders
+        for piece, directions in (("B", BISHOP_DIRECTIONS), ("R", ROOK_DIRECTIONS), ("Q", range(8))):
+            sliders = boards[ally + piece] & fromMask
+            while sliders:
+                bit = sliders & -sliders
+                sliders ^= bit
+                sq = bit.bit_length() - 1
+                targets = slidingAttacks(sq, occupied, directions) & targetMask
+                if sq in pinLines:
+                    targets &= pinLines[sq]
+                self.addMoves(sq, targets, moves)
+
+        # Pawns
+        pawns = boards[ally + "p"] & fromMask
+        step = -8 if ally == "w" else 8
+        startRow = 6 if ally == "w" else 1
+        promotionRow = 1 if ally == "w" else 6
+        while pawns:
+            bit = pawns & -pawns
+            pawns ^= bit
+            sq = bit.bit_length() - 1
+            allowed = pinLines[sq] if sq in pinLines else ~0
+            pushes = 0
+            oneStep = sq + step
+            if (1 << oneStep) & empty:
+                pushes |= 1 << oneStep
+                twoStep = oneStep + step
+                if sq >> 3 == startRow and (1 << twoStep) & empty:
+                    pushes |= 1 << twoStep
+            if sq >> 3 == promotionRow:
+                if captures:
+                    targets = pushes | (PAWN_ATTACKS[ally][sq] & enemyPieces)
+                    self.addMoves(sq, targets & allowed, moves, PROMOTION_FLAG)
+                continue
+            targets = (PAWN_ATTACKS[ally][sq] & enemyPieces if captures else 0) | (pushes if quiets else 0)
+            self.addMoves(sq, targets & allowed, moves)
+
+            if captures and self.enpassantPossible != ():
+                epSq = self.enpassantPossible[0] * 8 + self.enpassantPossible[1]
+                if PAWN_ATTACKS[ally][sq] & (1 << epSq):
+                    if (1 << epSq) & allowed and self.enpassantIsSafe(sq, epSq, epSq - step, enemy, kingSq):
+                        moves.append(sq | (epSq << 6) | ENPASSANT_FLAG)
+
+    # --- Staged generation (see GameState.pickMoves) ---
+
+    def prepareMoveGeneration(self):
+        self.checkers, self.pinLines = self.findChecksAndPins()
+        return self.inCheck, self.pins, self.checks, self.checkers, self.pinLines
+
+    def restoreMoveGeneration(self, snapshot):
+        self.inCheck, self.pins, self.checks, self.checkers, self.pinLines = snapshot
+
+    def isCaptureOrPromotion(self, code):
+        return bool(code & (ENPASSANT_FLAG | PROMOTION_FLAG)) or (self.allOccupancy >> ((code >> 6) & 63)) & 1 == 1
+
+    def getCaptureMoveCodes(self):
+        return self.getStagedMoves(True, False, -1)
+
+    def getQuietMoveCodes(self):
+        return self.getStagedMoves(False, True, -1)
+
+    def getSquareMoveCodes(self, sq):
+        return self.getStagedMoves(True, True, 1 << sq)
+
+    def getStagedMoves(self, captures, quiets, fromMask):
+        moves = []
+        ally = "w" if self.whiteToMove else "b"
+        enemy = "b" if self.whiteToMove else "w"
+        ownPieces = self.occupancy[ally]
+        if not fromMask & ownPieces:
+            return moves
+        enemyPieces = self.occupancy[enemy]
+        occupied = self.allOccupancy
+        king = self.pieceBoards[ally + "K"]
+        kingSq = king.bit_length() - 1
+        if king & fromMask:
+            targets = KING_ATTACKS[kingSq] & ~self.getAttackMap() & \
+                ((enemyPieces if captures else 0) | (~occupied if quiets else 0))
+            self.addMoves(kingSq, targets, moves)
+            if quiets:
+                self.getCastleMoves(kingSq >> 3, kingSq & 7, moves)
+        self.getPieceMoves(ally, enemy, ownPieces, enemyPieces, occupied, kingSq, self.pinLines, moves,
+                           captures, quiets, fromMask)
+        return moves
+
+    """
+    Both pawns leave their squares at once in an en-passant capture, which can expose the king
+    along the rank (or, after a check, along a diagonal); this replays the capture on the occupancy.
+    """
+    def enpassantIsSafe(self, sq, epSq, capturedSq, enemy, kingSq):
+        boards = self.pieceBoards
+        afterOccupied = (self.allOccupancy ^ (1 << sq) ^ (1 << capturedSq)) | (1 << epSq)
+        queens = boards[enemy + "Q"]
+        return not (rookAttacks(kingSq, afterOccupied) & (boards[enemy + "R"] | queens)) and \
+            not (bishopAttacks(kingSq, afterOccupied) & (boards[enemy + "B"] | queens))
+
+    """
+    Moves that resolve a single check, generated from the target squares: pieces that can capture
+    the checker and pieces that can step onto the line between checker and king.
+    (King moves are added by getValidMoveCodes.) Pinned pieces can never resolve a check.
+    """
+    def getCheckEvasions(self, ally, enemy, kingSq, checkers, pinLines, moves):
+        boards = self.pieceBoards
+        occupied = self.allOccupancy
+        checkSq = checkers.bit_length() - 1
+        pinned = 0
+        for sq in pinLines:
+            pinned |= 1 << sq
+        movable = self.occupancy[ally] & ~pinned & ~boards[ally + "K"]
+        pawns = boards[ally + "p"] & movable
+        step = -8 if ally == "w" else 8
+        backRow = 0 if ally == "w" else 7
+        doublePushRow = 4 if ally == "w" else 3
+
+        # Capture the checker
+        flags = PROMOTION_FLAG if checkSq >> 3 == backRow else 0
+        attackers = self.attackersOf(checkSq, ally, occupied) & movable
+        while attackers:
+            bit = attackers & -attackers
+            attackers ^= bit
+            moves.append((bit.bit_length() - 1) | (checkSq << 6) | (flags if bit & pawns else 0))
+
+        # Block the line (empty for knight and pawn checks)
+        between = BETWEEN[kingSq][checkSq]
+        line = between
+        while line:
+            bit = line & -line
+            line ^= bit
+            sq = bit.bit_length() - 1
+            blockers = self.attackersOf(sq, ally, occupied) & movable & ~pawns
+            while blockers:
+                blocker = blockers & -blockers
+                blockers ^= blocker
+                moves.append((blocker.bit_length() - 1) | (sq << 6))
+            flags = PROMOTION_FLAG if sq >> 3 == backRow else 0
+            fromSq = sq - step
+            if 0 <= fromSq < 64:
+                if (1 << fromSq) & pawns:
+                    moves.append(fromSq | (sq << 6) | flags)
+                elif not (1 << fromSq) & occupied and sq >> 3 == doublePushRow and (1 << (fromSq - step)) & pawns:
+                    moves.append((fromSq - step) | (sq << 6))
+
+        # En passant: removes a checking pawn that just moved two squares, or lands on the line
+        if self.enpassantPossible != ():
+            epSq = self.enpassantPossible[0] * 8 + self.enpassantPossible[1]
+            capturedSq = epSq - step
+            if capturedSq == checkSq or (between >> epSq) & 1:
+                capturers = PAWN_ATTACKS[enemy][epSq] & pawns
+                while capturers:
+                    bit = capturers & -capturers
+                    capturers ^= bit
+                    sq = bit.bit_length() - 1
+                    if self.enpassantIsSafe(sq, epSq, capturedSq, enemy, kingSq):
+                        moves.append(sq | (epSq << 6) | ENPASSANT_FLAG)
+
+    def addMoves(self, sq, targets, moves, flags=0):
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            moves.append(sq | ((bit.bit_length() - 1) << 6) | flags)
@@ -1,4 +1,10 @@
-from .move import Move
+from .move import Move, SQUARE_COORDS, ENPASSANT_FLAG, CASTLE_FLAG, PROMOTION_FLAG, PROMOTION_PIECES, PROMOTION_SHIFT, NULL_MOVE
+from . import zobrist
+from .tables import (
+    DIRECTIONS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, KNIGHT_TARGETS, KING_TARGETS, RAY_TARGETS,
+    KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, BETWEEN, DIRECTION_INDEX,
+)
+from .repetition import RepetitionTracker
 
 class GameState:
     def __init__(self):
@@ -15,7 +21,8 @@ class GameState:
         ]
 
         self.whiteToMove = True
-        self.moveLog = []  # Move objects
+        self.moveLog = []  # packed move codes (see Engine/move.py)
+        self.captureLog = []  # piece captured by each move in moveLog ("--" if none)
         self.moveFunctions = {
             "p": self.getPawnMove,
             "N": self.getKnightMove,
@@ -34,8 +41,10 @@ class GameState:
         self.inCheck = False
         self.pins = []
         self.checks = []
-        
-        self.boardHistory = []
+        # pinDirections[row * 8 + col] = (rowStep, colStep) of the pin line through a pinned piece, else None
+        self.pinDirections = NO_PINS
+        # squares attacked by the side not to move, see getAttackMap (None = not computed yet)
+        self.attackMap = None
         
         # the corrdinates where an enpassant capture is possible
         self.enpassantPossible = ()
@@ -50,42 +59,205 @@ class GameState:
             )
         ]
 
+        # 64-bit Zobrist key of the current position, kept up to date by makeMove/undoMove
+        self.zobristKey = zobrist.computeKey(self)
+        self.zobristLog = [self.zobristKey]
+        # occurrence counts of every position key, for threefold repetition
+        self.repetitions = RepetitionTracker(self.zobristKey)
+        # plies played before this GameState took over (set from the FEN clocks), see fullmoveNumber
+        self.plyOffset = 0
+        self.halfmoveOffset = 0
+
+    """
+    Creates a GameState (or subclass) set up from a FEN string.
+    """
+    @classmethod
+    def fromFEN(cls, fen):
+        gs = cls()
+        gs.setFEN(fen)
+        return gs
+
+    """
+    Sets up the position of a FEN string directly: board, side to move, castling rights, en-passant
+    square and clocks. The move history is cleared and the hash and repetition tracking restart here.
+    """
+    def setFEN(self, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("Invalid FEN: " + fen)
+        ranks = fields[0].split("/")
+        if len(ranks) != 8:
+            raise ValueError("Invalid FEN: " + fen)
+
+        board = []
+        for r, rank in enumerate(ranks):
+            row = []
+            for ch in rank:
+                if ch.isdigit():
+                    row.extend(["--"] * int(ch))
+                elif ch in FEN_PIECES:
+                    row.append(FEN_PIECES[ch])
+                    if ch == "K":
+                        self.whiteKingLocation = (r, len(row) - 1)
+                    elif ch == "k":
+                        self.blackKingLocation = (r, len(row) - 1)
+                else:
+                    raise ValueError("Invalid FEN: " + fen)
+            if len(row) != 8:
+                raise ValueError("Invalid FEN: " + fen)
+            board.append(row)
+        self.board = board
+
+        self.whiteToMove = fields[1] == "w"
+        rights = fields[2]
+        self.currentCastlingRights = CastleRights("K" in rights, "k" in rights, "Q" in rights, "q" in rights)
+        self.castleRightLog = [CastleRights("K" in rights, "k" in rights, "Q" in rights, "q" in rights)]
+        if fields[3] == "-":
+            self.enpassantPossible = ()
+        else:
+            self.enpassantPossible = (Move.ranksToRows[fields[3][1]], Move.fileToCols[fields[3][0]])
+        self.enpassantPossibleLog = [self.enpassantPossible]
+        self.halfmoveOffset = int(fields[4]) if len(fields) > 4 else 0
+        fullmove = int(fields[5]) if len(fields) > 5 else 1
+        self.plyOffset = 2 * (fullmove - 1) + (0 if self.whiteToMove else 1)
+
+        self.moveLog = []
+        self.captureLog = []
+        self.checkmate = False
+        self.stalemate = False
+        self.inCheck = False
+        self.pins = []
+        self.checks = []
+        self.pinDirections = NO_PINS
+        self.attackMap = None
+        self.zobristKey = zobrist.computeKey(self)
+        self.zobristLog = [self.zobristKey]
+        self.repetitions = RepetitionTracker(self.zobristKey)
+
+    def toFEN(self):
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece[1].upper() if piece[0] == "w" else piece[1].lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+
+        rights = self.currentCastlingRights
+        castling = ("K" if rights.wks else "") + ("Q" if rights.wqs else "") + \
+                   ("k" if rights.bks else "") + ("q" if rights.bqs else "")
+        if self.enpassantPossible != ():
+            r, c = self.enpassantPossible
+            enpassant = Move.colsToFiles[c] + Move.rowsToRanks[r]
+        else:
+            enpassant = "-"
+        return " ".join([
+            "/".join(ranks), "w" if self.whiteToMove else "b", castling or "-", enpassant,
+            str(self.halfmoveClock()), str(self.fullmoveNumber()),
+        ])
+
+    """
+    Plies since the last capture or pawn move.
+    Walks back over the irreversible moves the repetition tracker remembers; the ones that only took
+    castling rights away (king and rook moves) don't reset the fifty-move count, so they are skipped.
+    """
+    def halfmoveClock(self):
+        irreversibleLog = self.repetitions.irreversibleLog
+        castleRightLog = self.castleRightLog
+        current = len(self.moveLog)
+        boundary = irreversibleLog[-1]
+        while boundary > 0:
+            i = boundary - 1  # the move that reached position `boundary`
+            if self.captureLog[i] != "--" or \
+                    zobrist.castleIndex(castleRightLog[boundary]) == zobrist.castleIndex(castleRightLog[i]):
+                return current - boundary
+            boundary = irreversibleLog[i]
+        return current + self.halfmoveOffset
+
+    def fullmoveNumber(self):
+        return (self.plyOffset + len(self.moveLog)) // 2 + 1
+
     def makeMove(self, move):
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
-        self.moveLog.append(move)
+        self.makeMoveCode(move.code)
+
+    """
+    Plays a move given as a packed int (see Engine/move.py).
+    The search works with these directly; makeMove above is the entry point for Move objects.
+    """
+    def makeMoveCode(self, code):
+        board = self.board
+        startSq = code & 63
+        endSq = (code >> 6) & 63
+        startRow, startCol = SQUARE_COORDS[startSq]
+        endRow, endCol = SQUARE_COORDS[endSq]
+        pieceMoved = board[startRow][startCol]
+        pieceCaptured = board[endRow][endCol]
+
+        pieceKeys = zobrist.pieceKeys
+        key = self.zobristKey ^ zobrist.sideKey
+        key ^= pieceKeys[pieceMoved][startSq]
+        if pieceCaptured != "--":
+            key ^= pieceKeys[pieceCaptured][endSq]
+        if self.enpassantPossible != ():
+            key ^= zobrist.enpassantKeys[self.enpassantPossible[1]]
+        oldCastleIndex = zobrist.castleIndex(self.currentCastlingRights)
+        key ^= zobrist.castleKeys[oldCastleIndex]
+
+        board[startRow][startCol] = "--"
+        board[endRow][endCol] = pieceMoved
+        self.moveLog.append(code)
+        self.attackMap = None
         self.whiteToMove = not self.whiteToMove 
         # update the both of the kings location after making a move
-        if move.pieceMoved == "wK":
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == "bK":
-            self.blackKingLocation = (move.endRow, move.endCol)
+        if pieceMoved == "wK":
+            self.whiteKingLocation = (endRow, endCol)
+        elif pieceMoved == "bK":
+            self.blackKingLocation = (endRow, endCol)
             
         # Pawn Promotion
-        if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + move.promotedPiece
+        if code & PROMOTION_FLAG:
+            board[endRow][endCol] = pieceMoved[0] + PROMOTION_PIECES[code >> PROMOTION_SHIFT]
             
         # Enpassant move
-        if move.isEnpassantMove:
-            self.board[move.startRow][move.endCol] = "--" 
+        if code & ENPASSANT_FLAG:
+            pieceCaptured = board[startRow][endCol]
+            board[startRow][endCol] = "--" 
+            key ^= pieceKeys[pieceCaptured][startRow * 8 + endCol]
+        self.captureLog.append(pieceCaptured)
             
         # Update enpassantPossible variable
-        if move.pieceMoved[1] == "p" and abs(move.startRow - move.endRow) == 2:
-            self.enpassantPossible = ((move.startRow + move.endRow) // 2, move.startCol)
+        if pieceMoved[1] == "p" and abs(startRow - endRow) == 2:
+            self.enpassantPossible = ((startRow + endRow) // 2, startCol)
+            key ^= zobrist.enpassantKeys[startCol]
         else:
             self.enpassantPossible = ()
             
         # Castling
-        if move.isCastleMove:
-            if move.endCol - move.startCol == 2:  # King side
-                self.board[move.endRow][move.endCol - 1] = self.board[move.endRow][move.endCol + 1]
-                self.board[move.endRow][move.endCol + 1] = "--"
-            elif move.endCol - move.startCol == -2:  # Queen side
-                self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 2]
-                self.board[move.endRow][move.endCol - 2] = "--"
+        if code & CASTLE_FLAG:
+            if endCol - startCol == 2:  # King side
+                rook = board[endRow][endCol + 1]
+                board[endRow][endCol - 1] = rook
+                board[endRow][endCol + 1] = "--"
+                key ^= pieceKeys[rook][endSq + 1] ^ pieceKeys[rook][endSq - 1]
+            elif endCol - startCol == -2:  # Queen side
+                rook = board[endRow][endCol - 2]
+                board[endRow][endCol + 1] = rook
+                board[endRow][endCol - 2] = "--"
+                key ^= pieceKeys[rook][endSq - 2] ^ pieceKeys[rook][endSq + 1]
+
+        # the piece standing on the end square now (differs from pieceMoved after a promotion)
+        key ^= pieceKeys[board[endRow][endCol]][endSq]
                 
         self.enpassantPossibleLog.append(self.enpassantPossible)
-        self.updateCastlRights(move)
+        self.updateCastlRights(pieceMoved, startRow, startCol, pieceCaptured, endRow, endCol)
         self.castleRightLog.append(
             CastleRights(
                 self.currentCastlingRights.wks,
@@ -94,26 +266,42 @@ class GameState:
                 self.currentCastlingRights.bqs,
             )
         )
-        
-        boardHash = str(self.board) + str(self.whiteToMove)
-        self.boardHistory.append(boardHash)
+        newCastleIndex = zobrist.castleIndex(self.currentCastlingRights)
+        key ^= zobrist.castleKeys[newCastleIndex]
+
+        self.zobristKey = key
+        self.zobristLog.append(key)
+        # pawn moves, captures and lost castling rights can never be undone by later moves
+        irreversible = pieceMoved[1] == "p" or pieceCaptured != "--" or oldCastleIndex != newCastleIndex
+        self.repetitions.push(key, irreversible)
 
     def undoMove(self):
         if len(self.moveLog) != 0:
-            move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            if self.moveLog[-1] == NULL_MOVE:
+                self.undoNullMove()
+                return
+            board = self.board
+            code = self.moveLog.pop()
+            pieceCaptured = self.captureLog.pop()
+            startRow, startCol = SQUARE_COORDS[code & 63]
+            endRow, endCol = SQUARE_COORDS[(code >> 6) & 63]
+            pieceMoved = board[endRow][endCol]
+            if code & PROMOTION_FLAG:
+                pieceMoved = pieceMoved[0] + "p"
+            board[startRow][startCol] = pieceMoved
+            board[endRow][endCol] = pieceCaptured
             self.whiteToMove = not self.whiteToMove 
-            if move.pieceMoved == "wK":
-                self.whiteKingLocation = (move.startRow, move.startCol)
-            elif move.pieceMoved == "bK":
-                self.blackKingLocation = (move.startRow, move.startCol)
+            self.attackMap = None
+            if pieceMoved == "wK":
+                self.whiteKingLocation = (startRow, startCol)
+            elif pieceMoved == "bK":
+                self.blackKingLocation = (startRow, startCol)
             self.checkmate = False
             self.stalemate = False
             
-            if move.isEnpassantMove:
-                self.board[move.endRow][move.endCol] = "--"
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
+            if code & ENPASSANT_FLAG:
+                board[endRow][endCol] = "--"
+                board[startRow][endCol] = pieceCaptured
                 
             self.enpassantPossibleLog.pop()
             self.enpassantPossible = self.enpassantPossibleLog[-1]
@@ -124,50 +312,115 @@ class GameState:
                 newRights.wks, newRights.bks, newRights.wqs, newRights.bqs
             )
             
-            if move.isCastleMove:
-                if move.endCol - move.startCol == 2: 
-                    self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 1]
-                    self.board[move.endRow][move.endCol - 1] = "--"
-                elif move.endCol - move.startCol == -2: 
-                    self.board[move.endRow][move.endCol - 2] = self.board[move.endRow][move.endCol + 1]
-                    self.board[move.endRow][move.endCol + 1] = "--"
+            if code & CASTLE_FLAG:
+                if endCol - startCol == 2: 
+                    board[endRow][endCol + 1] = board[endRow][endCol - 1]
+                    board[endRow][endCol - 1] = "--"
+                elif endCol - startCol == -2: 
+                    board[endRow][endCol - 2] = board[endRow][endCol + 1]
+                    board[endRow][endCol + 1] = "--"
             
-            if len(self.boardHistory) > 0:
-                self.boardHistory.pop()
+            self.zobristLog.pop()
+            self.zobristKey = self.zobristLog[-1]
+            self.repetitions.pop()
+
+    """
+    Null move, for the search: the side to move passes. Flips the side to move and clears the en passant
+    square (updating the Zobrist key); the board is not touched. It goes on the move log as NULL_MOVE, so
+    undoMove takes it back like any other move, and counts as irreversible, so no repetition is found
+    across it. Never legal in a real game, and meaningless while the side to move is in check.
+    """
+    def makeNullMove(self):
+        key = self.zobristKey ^ zobrist.sideKey
+        if self.enpassantPossible != ():
+            key ^= zobrist.enpassantKeys[self.enpassantPossible[1]]
+        self.moveLog.append(NULL_MOVE)
+        self.captureLog.append("--")
+        self.whiteToMove = not self.whiteToMove
+        self.attackMap = None
+        self.enpassantPossible = ()
+        self.enpassantPossibleLog.append(())
+        self.castleRightLog.append(self.castleRightLog[-1])
+        self.zobristKey = key
+        self.zobristLog.append(key)
+        self.repetitions.push(key, True)
+
+    def undoNullMove(self):
+        self.moveLog.pop()
+        self.captureLog.pop()
+        self.whiteToMove = not self.whiteToMove
+        self.attackMap = None
+        self.enpassantPossibleLog.pop()
+        self.enpassantPossible = self.enpassantPossibleLog[-1]
+        self.castleRightLog.pop()
+        self.zobristLog.pop()
+        self.zobristKey = self.zobristLog[-1]
+        self.repetitions.pop()
+
+    # True if the side to move has a piece other than pawns and its king (without one, zugzwang is common)
+    def hasNonPawnMaterial(self):
+        color = "w" if self.whiteToMove else "b"
+        for row in self.board:
+            for square in row:
+                if square[0] == color and square[1] in "NBRQ":
+                    return True
+        return False
+
+    """
+    Returns the last move played as a full Move object (the GUI needs one to animate it).
+    """
+    def getLastMove(self):
+        code = self.moveLog[-1]
+        move = Move.fromCode(code, self.board)
+        # fromCode reads the board the move starts from, this one is the board after it
+        move.pieceMoved = self.board[move.endRow][move.endCol]
+        if move.isPawnPromotion:
+            move.pieceMoved = move.pieceMoved[0] + "p"
+        move.pieceCaptured = self.captureLog[-1]
+        move.isCapture = move.pieceCaptured != "--"
+        return move
 
-    def updateCastlRights(self, move):
-        if move.pieceMoved == "wK":
+    def updateCastlRights(self, pieceMoved, startRow, startCol, pieceCaptured, endRow, endCol):
+        if pieceMoved == "wK":
             self.currentCastlingRights.wks = False
             self.currentCastlingRights.wqs = False
-        elif move.pieceMoved == "bK":
+        elif pieceMoved == "bK":
             self.currentCastlingRights.bks = False
             self.currentCastlingRights.bqs = False
-        elif move.pieceMoved == "wR":
-            if move.startRow == 7:
-                if move.startCol == 0: 
+        elif pieceMoved == "wR":
+            if startRow == 7:
+                if startCol == 0: 
                     self.currentCastlingRights.wqs = False
-                if move.startCol == 7: 
+                if startCol == 7: 
                     self.currentCastlingRights.wks = False
-        elif move.pieceMoved == "bR":
-            if move.startRow == 0:
-                if move.startCol == 0: 
+        elif pieceMoved == "bR":
+            if startRow == 0:
+                if startCol == 0: 
                     self.currentCastlingRights.bqs = False
-                if move.startCol == 7: 
+                if startCol == 7: 
                     self.currentCastlingRights.bks = False
         
-        if move.pieceCaptured == "wR":
-            if move.endRow == 7:
-                if move.endCol == 0: self.currentCastlingRights.wqs = False
-                elif move.endCol == 7: self.currentCastlingRights.wks = False
-        elif move.pieceCaptured == "bR":
-            if move.endRow == 0:
-                if move.endCol == 0: self.currentCastlingRights.bqs = False
-                elif move.endCol == 7: self.currentCastlingRights.bks = False
+        if pieceCaptured == "wR":
+            if endRow == 7:
+                if endCol == 0: self.currentCastlingRights.wqs = False
+                elif endCol == 7: self.currentCastlingRights.wks = False
+        elif pieceCaptured == "bR":
+            if endRow == 0:
+                if endCol == 0: self.currentCastlingRights.bqs = False
+                elif endCol == 7: self.currentCastlingRights.bks = False
 
     """
-    Advanced getValidMoves with Pin/Check Logic
+    Legal moves as Move objects, for the GUI and anything else that wants to inspect them.
+    Also updates inCheck/checkmate/stalemate.
     """
     def getValidMoves(self):
+        board = self.board
+        return [Move.fromCode(code, board) for code in self.getValidMoveCodes()]
+
+    """
+    Advanced getValidMoves with Pin/Check Logic, returning packed move codes
+    """
+    def getValidMoveCodes(self):
         moves = []
         self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
         
@@ -179,39 +432,13 @@ class GameState:
             kingCol = self.blackKingLocation[1]
             
         if self.inCheck:
-            if len(self.checks) == 1:  # only 1 check, block or move king
-                moves = self.getAllPossibleMoves()
-                # to block check, move piece into one of the squares between king and attacker
-                check = self.checks[0] 
-                checkRow = check[0]
-                checkCol = check[1]
-                pieceChecking = self.board[checkRow][checkCol]
-                validSquares = [] 
-                
-                # if knight, must capture knight or move king, other pieces can be blocked
-                if pieceChecking[1] == 'N':
-                    validSquares = [(checkRow, checkCol)]
-                else:
-                    for i in range(1, 8):
-                        validSquare = (kingRow + check[2] * i, kingCol + check[3] * i) 
-                        validSquares.append(validSquare)
-                        if validSquare[0] == checkRow and validSquare[1] == checkCol:
-                            break
-                
-                # filter out moves that don't block check or move king
-                for i in range(len(moves) - 1, -1, -1): 
-                    if moves[i].pieceMoved[1] != 'K': # move doesn't move king so it must block or capture
-                        if not (moves[i].endRow, moves[i].endCol) in validSquares:
-                            moves.remove(moves[i])
-            else: # double check, king has to move
-                self.getKingMove(kingRow, kingCol, moves)
+            self.getCheckEvasions(kingRow, kingCol, moves)
         else: # not in check so all moves are fine
             moves = self.getAllPossibleMoves()
+            # Castling moves
+            self.getCastleMoves(kingRow, kingCol, moves)
         
-        boardHash = str(self.board) + str(self.whiteToMove)
-        repetition = False
-        if self.boardHistory.count(boardHash) >= 3:
-            repetition = True
+        repetition = self.repetitions.isRepetition()
             
         if len(moves) == 0:
             if self.inCheck:
@@ -225,14 +452,380 @@ class GameState:
             else:
                 self.stalemate = False
             
-        # Castling moves
+        return moves
+
+    # --- Staged move generation, for the search ---
+
+    """
+    Staged move picker: yields the legal moves of the position one at a time, the most promising
+    first, and only generates each group when the moves before it did not end the search of the node:
+        1. the hash move (best move the transposition table remembers for this position)
+        2. captures and promotions, Most Valuable Victim - Least Valuable Aggressor first, except the
+           ones that lose material by static exchange
+        3. the `killers`: quiet moves that refuted other positions (killer moves, countermove)
+        4. the remaining quiet moves, by their score in `history` (indexed by from | to << 6) if given
+        5. the losing captures
+    A beta cutoff on a hash move or a capture never pays for generating the quiet moves.
+    Hash and killer moves come from other positions, so they are checked against the legal moves
+    of their piece first. In check the few evasions are generated at once and yielded in the same order.
+    The caller may make/undo moves between two steps, as long as the board is back when it resumes.
+    If nothing is yielded, inCheck tells checkmate from stalemate.
+    """
+    def pickMoves(self, hashMove=None, killers=(), history=None):
+        board = self.board
+        snapshot = self.prepareMoveGeneration()
+        if self.inCheck:
+            evasions = self.getEvasionCodes()
+            if hashMove in evasions:
+                yield hashMove
+            captures = [code for code in evasions if code != hashMove and self.isCaptureOrPromotion(code)]
+            captures.sort(key=lambda code: mvvLvaScore(board, code), reverse=True)
+            quiets = [code for code in evasions if code != hashMove and not self.isCaptureOrPromotion(code)]
+            if history is not None:
+                quiets.sort(key=lambda code: history[code & 4095], reverse=True)
+            yield from captures
+            for killer in killers:
+                if killer in quiets:
+                    quiets.remove(killer)
+                    yield killer
+            yield from quiets
+            return
+
+        if hashMove is not None and hashMove in self.getSquareMoveCodes(hashMove & 63):
+            yield hashMove
+            self.restoreMoveGeneration(snapshot)
+
+        captures = self.getCaptureMoveCodes()
+        captures.sort(key=lambda code: mvvLvaScore(board, code), reverse=True)
+        losingCaptures = []
+        for code in captures:
+            if code != hashMove:
+                if self.isLosingCapture(code):
+                    losingCaptures.append(code)
+                else:
+                    yield code
+
+        killersPlayed = []
+        for killer in killers:
+            if killer is None or killer == hashMove or killer in killersPlayed:
+                continue
+            self.restoreMoveGeneration(snapshot)
+            if not self.isCaptureOrPromotion(killer) and killer in self.getSquareMoveCodes(killer & 63):
+                killersPlayed.append(killer)
+                yield killer
+
+        self.restoreMoveGeneration(snapshot)
+        quiets = self.getQuietMoveCodes()
+        if history is not None:
+            quiets.sort(key=lambda code: history[code & 4095], reverse=True)
+        for code in quiets:
+            if code != hashMove and code not in killersPlayed:
+                yield code
+        yield from losingCaptures
+
+    """
+    Moves for the quiescence search: captures and promotions ordered by MVV-LVA, or every evasion
+    (captures first) when the side to move is in check, since then it can't decline to move.
+    Sets inCheck.
+    """
+    def getTacticalMoveCodes(self):
+        board = self.board
+        self.prepareMoveGeneration()
+        if self.inCheck:
+            moves = self.getEvasionCodes()
+            moves.sort(key=lambda code: mvvLvaScore(board, code) if self.isCaptureOrPromotion(code) else -100,
+                       reverse=True)
+        else:
+            moves = self.getCaptureMoveCodes()
+            moves.sort(key=lambda code: mvvLvaScore(board, code), reverse=True)
+        return moves
+
+    # Legal moves while in check, leaving the checkmate/stalemate flags of the game alone
+    def getEvasionCodes(self):
+        checkmate, stalemate = self.checkmate, self.stalemate
+        moves = self.getValidMoveCodes()
+        self.checkmate, self.stalemate = checkmate, stalemate
+        return moves
+
+    """
+    Finds checks and pins for the side to move and returns them as a snapshot.
+    The staged generators (getCaptureMoveCodes, getQuietMoveCodes, getSquareMoveCodes) rely on it;
+    after other positions have been searched, restoreMoveGeneration puts the snapshot back.
+    """
+    def prepareMoveGeneration(self):
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        return self.inCheck, self.pins, self.checks, self.pinDirections
+
+    def restoreMoveGeneration(self, snapshot):
+        self.inCheck, self.pins, self.checks, self.pinDirections = snapshot
+
+    def isCaptureOrPromotion(self, code):
+        if code & (ENPASSANT_FLAG | PROMOTION_FLAG):
+            return True
+        endRow, endCol = SQUARE_COORDS[(code >> 6) & 63]
+        return self.board[endRow][endCol] != "--"
+
+    # --- Static exchange evaluation ---
+
+    """
+    Static exchange evaluation: the material (in SEE_VALUES) the side to move wins or loses by playing
+    the capture `code`, if both sides then keep recapturing on that square with their least valuable
+    piece and each stops as soon as going on would lose. Pins and checks are not taken into account.
+    """
+    def staticExchange(self, code):
+        board = self.board
+        startSq = code & 63
+        endSq = (code >> 6) & 63
+        startRow, startCol = SQUARE_COORDS[startSq]
+        endRow, endCol = SQUARE_COORDS[endSq]
+        mover = board[startRow][startCol]
+        removed = 1 << startSq  # squares whose piece has been used up in the exchange
+        if code & ENPASSANT_FLAG:
+            gain = SEE_VALUES["p"]
+            removed |= 1 << (startRow * 8 + endCol)
+        else:
+            gain = SEE_VALUES.get(board[endRow][endCol][1], 0)
+        onSquare = SEE_VALUES[mover[1]]  # value of the piece the next capture would take
+        if code & PROMOTION_FLAG:
+            onSquare = SEE_VALUES[PROMOTION_PIECES[code >> PROMOTION_SHIFT]]
+            gain += onSquare - SEE_VALUES["p"]
+
+        # gains[i] = material won by the side making capture i if the exchange stopped right after it
+        gains = [gain]
+        color = "b" if mover[0] == "w" else "w"
+        while True:
+            attacker = self.leastValuableAttacker(endSq, color, removed)
+            if attacker is None:
+                break
+            square, piece = attacker
+            gains.append(onSquare - gains[-1])
+            onSquare = SEE_VALUES[piece]
+            removed |= 1 << square
+            color = "b" if color == "w" else "w"
+        # going back from the last capture, each side only captures if that is better than stopping
+        for i in range(len(gains) - 1, 0, -1):
+            gains[i - 1] = -max(-gains[i - 1], gains[i])
+        return gains[0]
+
+    """
+    The least valuable piece of `color` attacking square sq, ignoring the pieces on the squares in the
+    bitmask `removed` (sliders see through them, so x-ray attackers behind a piece that captured count).
+    Both backends pick the same piece: the first kind of pawn, knight, bishop, rook, queen, king that
+    attacks, and of that kind the one on the lowest square.
+    Returns (square, piece type) or None.
+    """
+    def leastValuableAttacker(self, sq, color, removed):
+        board = self.board
+        enemy = "b" if color == "w" else "w"
+        pawn = color + "p"
+        pawnSquares = PAWN_ATTACKS[enemy][sq] & ~removed
+        while pawnSquares:
+            target = (pawnSquares & -pawnSquares).bit_length() - 1
+            if board[target >> 3][target & 7] == pawn:
+                return target, "p"
+            pawnSquares &= pawnSquares - 1
+        knight = color + "N"
+        for r, c, target in KNIGHT_TARGETS[sq]:
+            if board[r][c] == knight and not (removed >> target) & 1:
+                return target, "N"
+        # the first piece in every direction
+        best = None
+        for d in range(8):
+            for r, c, target in RAY_TARGETS[d][sq]:
+                if (removed >> target) & 1:
+                    continue
+                piece = board[r][c]
+                if piece != "--":
+                    if piece[0] == color:
+                        kind = piece[1]
+                        if (kind == "Q" or kind == ("R" if d in ROOK_DIRECTIONS else "B")) and \
+                                (best is None or SEE_VALUES[kind] < SEE_VALUES[best[1]]
+                                 or (SEE_VALUES[kind] == SEE_VALUES[best[1]] and target < best[0])):
+                            best = (target, kind)
+                    break
+        if best is not None:
+            return best
+        king = color + "K"
+        for r, c, target in KING_TARGETS[sq]:
+            if board[r][c] == king and not (removed >> target) & 1:
+                return target, "K"
+        return None
+
+    # A capture that loses material by static exchange (it can only if the capturing piece is worth more)
+    def isLosingCapture(self, code):
+        if code & (ENPASSANT_FLAG | PROMOTION_FLAG):
+            return False
+        startRow, startCol = SQUARE_COORDS[code & 63]
+        endRow, endCol = SQUARE_COORDS[(code >> 6) & 63]
+        if SEE_VALUES[self.board[startRow][startCol][1]] <= SEE_VALUES.get(self.board[endRow][endCol][1], 0):
+            return False
+        return self.staticExchange(code) < 0
+
+    """
+    Legal captures, en-passant captures and promotions of the side to move.
+    Only valid when not in check (in check everything goes through getValidMoveCodes).
+    """
+    def getCaptureMoveCodes(self):
+        moves = []
+        board = self.board
+        pinDirections = self.pinDirections
         if self.whiteToMove:
-            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
+            allyColor, enemyColor, moveAmount, promotionRow = "w", "b", -1, 1
         else:
-            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
-            
+            allyColor, enemyColor, moveAmount, promotionRow = "b", "w", 1, 6
+        for r in range(8):
+            row = board[r]
+            for c in range(8):
+                piece = row[c]
+                if piece[0] != allyColor:
+                    continue
+                startSq = r * 8 + c
+                type = piece[1]
+                if type == "p":
+                    # pushes to the back row count as promotions here
+                    if r == promotionRow and board[r + moveAmount][c] == "--":
+                        pinDirection = pinDirections[startSq]
+                        if pinDirection is None or pinDirection[1] == 0:
+                            moves.append(startSq | ((startSq + 8 * moveAmount) << 6) | PROMOTION_FLAG)
+                    self.getPawnCaptures(r, c, moves)
+                elif type == "N":
+                    if pinDirections[startSq] is None:
+                        for endRow, endCol, endSq in KNIGHT_TARGETS[startSq]:
+                            if board[endRow][endCol][0] == enemyColor:
+                                moves.append(startSq | (endSq << 6))
+                elif type == "K":
+                    attacked = self.getAttackMap()
+                    for endRow, endCol, endSq in KING_TARGETS[startSq]:
+                        if board[endRow][endCol][0] == enemyColor and not (attacked >> endSq) & 1:
+                            moves.append(startSq | (endSq << 6))
+                else:
+                    pinDirection = pinDirections[startSq]
+                    directions = ROOK_DIRECTIONS if type == "R" else BISHOP_DIRECTIONS if type == "B" else range(8)
+                    for j in directions:
+                        d = DIRECTIONS[j]
+                        if pinDirection is not None and pinDirection != d and pinDirection != (-d[0], -d[1]):
+                            continue
+                        # only the first piece on the ray can be captured
+                        for endRow, endCol, endSq in RAY_TARGETS[j][startSq]:
+                            endPiece = board[endRow][endCol]
+                            if endPiece != "--":
+                                if endPiece[0] == enemyColor:
+                                    moves.append(startSq | (endSq << 6))
+                                break
         return moves
 
+    """
+    Legal non-capturing, non-promoting moves of the side to move, castling included.
+    Only valid when not in check. The array piece generators produce captures and quiet moves
+    in one pass, so this generates everything and keeps the quiet moves.
+    """
+    def getQuietMoveCodes(self):
+        board = self.board
+        moves = self.getAllPossibleMoves()
+        kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        self.getCastleMoves(kingRow, kingCol, moves)
+        quiets = []
+        for code in moves:
+            if code & (ENPASSANT_FLAG | PROMOTION_FLAG):
+                continue
+            endRow, endCol = SQUARE_COORDS[(code >> 6) & 63]
+            if board[endRow][endCol] == "--":
+                quiets.append(code)
+        return quiets
+
+    """
+    Legal moves of the piece on square sq (none if it is not a piece of the side to move).
+    Only valid when not in check. Used to check that a move remembered from elsewhere is playable here.
+    """
+    def getSquareMoveCodes(self, sq):
+        moves = []
+        r, c = SQUARE_COORDS[sq]
+        piece = self.board[r][c]
+        if piece[0] == ("w" if self.whiteToMove else "b"):
+            self.moveFunctions[piece[1]](r, c, moves)
+            if piece[1] == "K":
+                self.getCastleMoves(r, c, moves)
+        return moves
+
+    """
+    Generates only the moves that get the side to move out of check:
+    king moves, captures of the checking piece and interpositions on the line between them.
+    Instead of generating everything and filtering, it starts from those few target squares and
+    looks for pieces that can reach them. A pinned piece can never resolve a check, so pinned
+    pieces are skipped altogether; with two checkers only the king can move.
+    """
+    def getCheckEvasions(self, kingRow, kingCol, moves):
+        board = self.board
+        self.getKingMove(kingRow, kingCol, moves)
+        if len(self.checks) != 1:
+            return
+
+        if self.whiteToMove:
+            allyColor, moveAmount, startRow, backRow = "w", -1, 6, 0
+        else:
+            allyColor, moveAmount, startRow, backRow = "b", 1, 1, 7
+        kingSq = kingRow * 8 + kingCol
+        checkRow, checkCol = self.checks[0][0], self.checks[0][1]
+        checkSq = checkRow * 8 + checkCol
+        pinDirections = self.pinDirections
+
+        # the checker's square plus (for sliders) the squares between it and the king
+        targets = BETWEEN[kingSq][checkSq] | (1 << checkSq)
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            endSq = bit.bit_length() - 1
+            endRow, endCol = SQUARE_COORDS[endSq]
+
+            # Knights that jump there
+            for r, c, sq in KNIGHT_TARGETS[endSq]:
+                if board[r][c] == allyColor + "N" and pinDirections[sq] is None:
+                    moves.append(sq | (endSq << 6))
+
+            # Sliders: walk out from the target, the first piece met decides
+            for j in range(8):
+                diagonal = DIRECTIONS[j][0] != 0 and DIRECTIONS[j][1] != 0
+                for r, c, sq in RAY_TARGETS[j][endSq]:
+                    piece = board[r][c]
+                    if piece == "--":
+                        continue
+                    if piece[0] == allyColor and pinDirections[sq] is None and \
+                        (piece[1] == "Q" or piece[1] == ("B" if diagonal else "R")):
+                        moves.append(sq | (endSq << 6))
+                    break
+
+            # Pawns: captures onto the checker, pushes onto the line
+            promotionFlag = PROMOTION_FLAG if endRow == backRow else 0
+            if endSq == checkSq:
+                for c in (endCol - 1, endCol + 1):
+                    r = endRow - moveAmount
+                    if 0 <= c < 8 and 0 <= r < 8 and board[r][c] == allyColor + "p" and pinDirections[r * 8 + c] is None:
+                        moves.append(r * 8 + c | (endSq << 6) | promotionFlag)
+            else:
+                r = endRow - moveAmount
+                if 0 <= r < 8:
+                    if board[r][endCol] == allyColor + "p":
+                        if pinDirections[r * 8 + endCol] is None:
+                            moves.append(r * 8 + endCol | (endSq << 6) | promotionFlag)
+                    elif board[r][endCol] == "--" and r - moveAmount == startRow and board[startRow][endCol] == allyColor + "p":
+                        if pinDirections[startRow * 8 + endCol] is None:
+                            moves.append(startRow * 8 + endCol | (endSq << 6))
+
+        # En passant can remove a checking pawn that just moved two squares, or (rarely) land on the
+        # check line; getPawnMove already knows all the edge cases of that capture
+        if self.enpassantPossible != ():
+            epRow, epCol = self.enpassantPossible
+            capturedSq = (epRow - moveAmount) * 8 + epCol
+            if capturedSq == checkSq or (BETWEEN[kingSq][checkSq] >> (epRow * 8 + epCol)) & 1:
+                r = epRow - moveAmount
+                for c in (epCol - 1, epCol + 1):
+                    if 0 <= c < 8 and board[r][c] == allyColor + "p" and pinDirections[r * 8 + c] is None:
+                        pawnMoves = []
+                        self.getPawnMove(r, c, pawnMoves)
+                        for code in pawnMoves:
+                            if code & ENPASSANT_FLAG:
+                                moves.append(code)
+
     def getAllPossibleMoves(self):
         moves = []
         for r in range(len(self.board)): 
@@ -247,267 +840,249 @@ class GameState:
         pins = [] 
         checks = [] 
         inCheck = False
+        board = self.board
         if self.whiteToMove:
             enemyColor = "b"
             allyColor = "w"
             startRow = self.whiteKingLocation[0]
             startCol = self.whiteKingLocation[1]
+            pawnRowStep = -1 # enemy pawns attack the king from the row in front of it
         else:
             enemyColor = "w"
             allyColor = "b"
             startRow = self.blackKingLocation[0]
             startCol = self.blackKingLocation[1]
+            pawnRowStep = 1
+        kingSq = startRow * 8 + startCol
+        pinDirections = NO_PINS
 
-        directions = [(-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
-        for j in range(len(directions)):
-            d = directions[j]
+        for j in range(8):
+            d = DIRECTIONS[j]
+            diagonal = d[0] != 0 and d[1] != 0
             possiblePin = () 
-            for i in range(1, 8):
-                endRow = startRow + d[0] * i
-                endCol = startCol + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: 
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColor and endPiece[1] != 'K':
+            first = True
+            for endRow, endCol, _ in RAY_TARGETS[j][kingSq]:
+                endPiece = board[endRow][endCol]
+                if endPiece[0] == allyColor and endPiece[1] != 'K':
+                    if possiblePin == (): 
+                        possiblePin = (endRow, endCol, d[0], d[1])
+                    else: 
+                        break
+                elif endPiece[0] == enemyColor:
+                    type = endPiece[1]
+                    if (not diagonal and type == 'R') or \
+                        (diagonal and type == 'B') or \
+                        (first and type == 'p' and diagonal and d[0] == pawnRowStep) or \
+                        (type == 'Q') or (first and type == 'K'):
                         if possiblePin == (): 
-                            possiblePin = (endRow, endCol, d[0], d[1])
-                        else: 
+                            inCheck = True
+                            checks.append((endRow, endCol, d[0], d[1]))
                             break
-                    elif endPiece[0] == enemyColor:
-                        type = endPiece[1]
-                        if (0 <= j <= 3 and type == 'R') or \
-                            (4 <= j <= 7 and type == 'B') or \
-                            (i == 1 and type == 'p' and ((enemyColor == 'w' and 6 <= j <= 7) or \
-                            (enemyColor == 'b' and 4 <= j <= 5))) or \
-                            (type == 'Q') or (i == 1 and type == 'K'):
-                            if possiblePin == (): 
-                                inCheck = True
-                                checks.append((endRow, endCol, d[0], d[1]))
-                                break
-                            else: 
-                                pins.append(possiblePin)
-                                break
                         else: 
+                            pins.append(possiblePin)
+                            if pinDirections is NO_PINS:
+                                pinDirections = [None] * 64
+                            pinDirections[possiblePin[0] * 8 + possiblePin[1]] = (d[0], d[1])
                             break
-                else: 
-                    break
+                    else: 
+                        break
+                first = False
         
-        knightMoves = [(1, 2), (1, -2), (-1, 2), (-1, -2), (2, 1), (2, -1), (-2, 1), (-2, -1)]
-        for m in knightMoves:
-            endRow = startRow + m[0]
-            endCol = startCol + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] == enemyColor and endPiece[1] == 'N': 
-                    inCheck = True
-                    checks.append((endRow, endCol, m[0], m[1]))
+        for endRow, endCol, _ in KNIGHT_TARGETS[kingSq]:
+            endPiece = board[endRow][endCol]
+            if endPiece[0] == enemyColor and endPiece[1] == 'N': 
+                inCheck = True
+                checks.append((endRow, endCol, endRow - startRow, endCol - startCol))
+        # pins by square, read (never modified) by the piece generators
+        self.pinDirections = pinDirections
         return inCheck, pins, checks
 
+    """
+    Bitmask (bit = row * 8 + col) of every square the opponent of the side to move attacks.
+    Our own king is treated as transparent, so the squares behind it on a checking line count as
+    attacked as well: the king can't escape a slider by stepping back along its line.
+    Computed once per position and cached until the next makeMove/undoMove.
+    """
+    def getAttackMap(self):
+        if self.attackMap is not None:
+            return self.attackMap
+        board = self.board
+        enemyColor = "b" if self.whiteToMove else "w"
+        ownKing = "wK" if self.whiteToMove else "bK"
+        pawnAttacks = PAWN_ATTACKS[enemyColor]
+        attacks = 0
+        for r in range(8):
+            row = board[r]
+            for c in range(8):
+                piece = row[c]
+                if piece[0] != enemyColor:
+                    continue
+                sq = r * 8 + c
+                type = piece[1]
+                if type == 'p':
+                    attacks |= pawnAttacks[sq]
+                elif type == 'N':
+                    attacks |= KNIGHT_ATTACKS[sq]
+                elif type == 'K':
+                    attacks |= KING_ATTACKS[sq]
+                else:
+                    directions = ROOK_DIRECTIONS if type == 'R' else BISHOP_DIRECTIONS if type == 'B' else range(8)
+                    for j in directions:
+                        for endRow, endCol, endSq in RAY_TARGETS[j][sq]:
+                            attacks |= 1 << endSq
+                            endPiece = board[endRow][endCol]
+                            if endPiece != "--" and endPiece != ownKing:
+                                break
+        self.attackMap = attacks
+        return attacks
+
     def squareUnderAttack(self, r, c):
         # We need this for Castling and King moves
-        # Simplified version using the reversed check logic or switching turns
-        self.whiteToMove = not self.whiteToMove # Switch to opponent to see their moves
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove # Switch back
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c:
-                return True
-        return False
+        return (self.getAttackMap() >> (r * 8 + c)) & 1 == 1
 
 
     def getPawnMove(self, r, c, moves):
         # Check if pinned
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins)-1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+        pinDirection = self.pinDirections[r * 8 + c]
+        piecePinned = pinDirection is not None
 
         if self.whiteToMove:
             moveAmount = -1
             startRow = 6
             backRow = 0
-            enemyColor = 'b'
-            kingRow, kingCol = self.whiteKingLocation
         else:
             moveAmount = 1
             startRow = 1
             backRow = 7
-            enemyColor = 'w'
-            kingRow, kingCol = self.blackKingLocation
         
-        pawnPromotion = False
+        startSq = r * 8 + c
+        # reaching the back row promotes (to a queen unless the GUI picks another piece)
+        promotionFlag = PROMOTION_FLAG if r + moveAmount == backRow else 0
 
         if self.board[r + moveAmount][c] == "--": 
-            if not piecePinned or pinDirection == (moveAmount, 0):
-                if r + moveAmount == backRow: # Pawn Promotion
-                    pawnPromotion = True
-                moves.append(Move((r, c), (r + moveAmount, c), self.board, isPawnPromotion=pawnPromotion))
+            if not piecePinned or pinDirection == (moveAmount, 0) or pinDirection == (-moveAmount, 0):
+                moves.append(startSq | ((startSq + 8 * moveAmount) << 6) | promotionFlag)
                 if r == startRow and self.board[r + 2 * moveAmount][c] == "--":
-                    moves.append(Move((r, c), (r + 2 * moveAmount, c), self.board))
+                    moves.append(startSq | ((startSq + 16 * moveAmount) << 6))
         
-        # Captures
+        self.getPawnCaptures(r, c, moves)
+
+    # Diagonal captures and en passant of the pawn on (r, c)
+    def getPawnCaptures(self, r, c, moves):
+        pinDirection = self.pinDirections[r * 8 + c]
+        piecePinned = pinDirection is not None
+
+        if self.whiteToMove:
+            moveAmount = -1
+            backRow = 0
+            enemyColor = 'b'
+            kingRow, kingCol = self.whiteKingLocation
+        else:
+            moveAmount = 1
+            backRow = 7
+            enemyColor = 'w'
+            kingRow, kingCol = self.blackKingLocation
+
+        startSq = r * 8 + c
+        promotionFlag = PROMOTION_FLAG if r + moveAmount == backRow else 0
+
         if c - 1 >= 0: 
             if not piecePinned or pinDirection == (moveAmount, -1):
                 if self.board[r + moveAmount][c - 1][0] == enemyColor:
-                    if r + moveAmount == backRow: pawnPromotion = True
-                    moves.append(Move((r, c), (r + moveAmount, c - 1), self.board, isPawnPromotion=pawnPromotion))
+                    moves.append(startSq | ((startSq + 8 * moveAmount - 1) << 6) | promotionFlag)
                 elif (r + moveAmount, c - 1) == self.enpassantPossible:
-                    # Enpassant attack check (tricky edge case)
-                    # Must verify that capturing enpassant doesn't leave King in check (rank attack)
-                    attackingPiece = blockingPiece = False
-                    if kingRow == r:
-                        if kingCol < c: # King is left of pawn
-                            # inside range(left+1, right)
-                            insideRange = range(kingCol + 1, c - 1) 
-                            outsideRange = range(c + 1, 8)
-                        else: # king right of pawn
-                            insideRange = range(c + 1, kingCol)
-                            outsideRange = range(c - 2, -1, -1)
-                        for i in insideRange:
-                            if self.board[r][i] != "--": 
-                                blockingPiece = True
-                        for i in outsideRange:
-                            square = self.board[r][i]
-                            if square[0] == enemyColor and (square[1] == "R" or square[1] == "Q"):
-                                attackingPiece = True
-                            elif square != "--":
-                                blockingPiece = True
-                    if not attackingPiece or blockingPiece:
-                        moves.append(Move((r, c), (r + moveAmount, c - 1), self.board, isEnpassantMove=True))
+                    if self.enpassantIsSafe(r, c, r + moveAmount, c - 1, enemyColor, kingRow, kingCol):
+                        moves.append(startSq | ((startSq + 8 * moveAmount - 1) << 6) | ENPASSANT_FLAG)
         
         if c + 1 <= 7: 
             if not piecePinned or pinDirection == (moveAmount, 1):
                 if self.board[r + moveAmount][c + 1][0] == enemyColor:
-                    if r + moveAmount == backRow: pawnPromotion = True
-                    moves.append(Move((r, c), (r + moveAmount, c + 1), self.board, isPawnPromotion=pawnPromotion))
+                    moves.append(startSq | ((startSq + 8 * moveAmount + 1) << 6) | promotionFlag)
                 elif (r + moveAmount, c + 1) == self.enpassantPossible:
-                    # Enpassant check logic (same as above)
-                    attackingPiece = blockingPiece = False
-                    if kingRow == r:
-                        if kingCol < c: 
-                            insideRange = range(kingCol + 1, c)
-                            outsideRange = range(c + 2, 8)
-                        else: 
-                            insideRange = range(c + 2, kingCol)
-                            outsideRange = range(c - 1, -1, -1)
-                        for i in insideRange:
-                            if self.board[r][i] != "--": blockingPiece = True
-                        for i in outsideRange:
-                            square = self.board[r][i]
-                            if square[0] == enemyColor and (square[1] == "R" or square[1] == "Q"):
-                                attackingPiece = True
-                            elif square != "--": blockingPiece = True
-                    if not attackingPiece or blockingPiece:
-                        moves.append(Move((r, c), (r + moveAmount, c + 1), self.board, isEnpassantMove=True))
+                    if self.enpassantIsSafe(r, c, r + moveAmount, c + 1, enemyColor, kingRow, kingCol):
+                        moves.append(startSq | ((startSq + 8 * moveAmount + 1) << 6) | ENPASSANT_FLAG)
+
+    """
+    En passant takes two pawns off the same rank at once, which can uncover an attack on the king that
+    the pin table knows nothing about (along that rank, or along a diagonal through the captured pawn).
+    Plays the capture on the board, looks from the king through both emptied squares for an enemy
+    slider and then puts everything back.
+    """
+    def enpassantIsSafe(self, r, c, endRow, endCol, enemyColor, kingRow, kingCol):
+        board = self.board
+        pawn, captured = board[r][c], board[r][endCol]
+        board[r][c] = board[r][endCol] = "--"
+        board[endRow][endCol] = pawn
+        kingSq = kingRow * 8 + kingCol
+        safe = True
+        for sq in (r * 8 + c, r * 8 + endCol):
+            d = DIRECTION_INDEX[kingSq][sq]
+            if d == -1:
+                continue
+            slider = "R" if d in ROOK_DIRECTIONS else "B"
+            for rayRow, rayCol, _ in RAY_TARGETS[d][kingSq]:
+                piece = board[rayRow][rayCol]
+                if piece != "--":
+                    if piece[0] == enemyColor and (piece[1] == slider or piece[1] == "Q"):
+                        safe = False
+                    break
+        board[endRow][endCol] = "--"
+        board[r][c], board[r][endCol] = pawn, captured
+        return safe
 
     def getKnightMove(self, r, c, moves):
-        # Check if pinned (Knights cannot move if pinned)
-        piecePinned = False
-        for i in range(len(self.pins)-1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                self.pins.remove(self.pins[i])
-                break
-        
-        if not piecePinned:
-            knightMoves = ((-1, -2), (-1, 2), (-2, -1), (-2, 1), (1, -2), (1, 2), (2, -1), (2, 1))
+        # Knights cannot move if pinned
+        if self.pinDirections[r * 8 + c] is None:
+            board = self.board
+            startSq = r * 8 + c
             allyColor = "w" if self.whiteToMove else "b"
-            for m in knightMoves:
-                endRow = r + m[0]
-                endCol = c + m[1]
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] != allyColor:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
+            for endRow, endCol, endSq in KNIGHT_TARGETS[startSq]:
+                if board[endRow][endCol][0] != allyColor:
+                    moves.append(startSq | (endSq << 6))
 
     def getBishopMove(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins)-1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+        pinDirection = self.pinDirections[r * 8 + c]
+        piecePinned = pinDirection is not None
         
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
-        enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--":
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:
-                            break
-                    else: break
-                else: break
+        self.getSlidingMoves(r, c, BISHOP_DIRECTIONS, piecePinned, pinDirection, moves)
 
     def getRockMove(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins)-1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+        pinDirection = self.pinDirections[r * 8 + c]
+        piecePinned = pinDirection is not None
                 
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
+        self.getSlidingMoves(r, c, ROOK_DIRECTIONS, piecePinned, pinDirection, moves)
+
+    def getSlidingMoves(self, r, c, directions, piecePinned, pinDirection, moves):
+        board = self.board
+        startSq = r * 8 + c
         enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--":
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:
-                            break
-                    else: break
-                else: break
+        for j in directions:
+            d = DIRECTIONS[j]
+            if piecePinned and pinDirection != d and pinDirection != (-d[0], -d[1]):
+                continue
+            for endRow, endCol, endSq in RAY_TARGETS[j][startSq]:
+                endPiece = board[endRow][endCol]
+                if endPiece == "--":
+                    moves.append(startSq | (endSq << 6))
+                elif endPiece[0] == enemyColor:
+                    moves.append(startSq | (endSq << 6))
+                    break
+                else:
+                    break
 
     def getQueenMove(self, r, c, moves):
         self.getBishopMove(r, c, moves)
         self.getRockMove(r, c, moves)
 
     def getKingMove(self, r, c, moves):
-        rowMoves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        colMoves = (-1, 0, 1, -1, 1, -1, 0, 1)
+        board = self.board
+        startSq = r * 8 + c
         allyColor = "w" if self.whiteToMove else "b"
-        for i in range(8):
-            endRow = r + rowMoves[i]
-            endCol = c + colMoves[i]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:
-                    # Place king on end square and check for checks
-                    if allyColor == 'w':
-                        self.whiteKingLocation = (endRow, endCol)
-                    else:
-                        self.blackKingLocation = (endRow, endCol)
-                    inCheck, pins, checks = self.checkForPinsAndChecks()
-                    if not inCheck:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    # Move king back
-                    if allyColor == 'w':
-                        self.whiteKingLocation = (r, c)
-                    else:
-                        self.blackKingLocation = (r, c)
+        attacked = self.getAttackMap()
+        for endRow, endCol, endSq in KING_TARGETS[startSq]:
+            # the king may go anywhere the enemy does not attack
+            if board[endRow][endCol][0] != allyColor and not (attacked >> endSq) & 1:
+                moves.append(startSq | (endSq << 6))
 
     def getCastleMoves(self, r, c, moves):
         if self.inCheck:
@@ -524,7 +1099,7 @@ class GameState:
     def getKingSideCastleMoves(self, r, c, moves):
         if self.board[r][c + 1] == "--" and self.board[r][c + 2] == "--":
             if not self.squareUnderAttack(r, c + 1) and not self.squareUnderAttack(r, c + 2):
-                moves.append(Move((r, c), (r, c + 2), self.board, isCastleMove=True))
+                moves.append(r * 8 + c | ((r * 8 + c + 2) << 6) | CASTLE_FLAG)
 
     def getQueenSideCastleMoves(self, r, c, moves):
         if (
@@ -533,7 +1108,38 @@ class GameState:
             and self.board[r][c - 3] == "--"
         ):
             if not self.squareUnderAttack(r, c - 1) and not self.squareUnderAttack(r, c - 2):
-                moves.append(Move((r, c), (r, c - 2), self.board, isCastleMove=True))
+                moves.append(r * 8 + c | ((r * 8 + c - 2) << 6) | CASTLE_FLAG)
+
+
+# FEN piece letter -> board string
+FEN_PIECES = {
+    "P": "wp", "N": "wN", "B": "wB", "R": "wR", "Q": "wQ", "K": "wK",
+    "p": "bp", "n": "bN", "b": "bB", "r": "bR", "q": "bQ", "k": "bK",
+}
+
+# Piece values for move ordering (the engine doesn't depend on the AI's evaluation)
+ORDER_VALUES = {"p": 1, "N": 3, "B": 3, "R": 5, "Q": 9, "K": 0}
+# Piece values of the static exchange evaluation: the king can take part, but never be given up
+SEE_VALUES = {"p": 1, "N": 3, "B": 3, "R": 5, "Q": 9, "K": 100}
+
+"""
+MVV-LVA score of a capture or promotion: 10 * victim - aggressor, plus the promoted piece.
+`board` is the position the move is played from.
+"""
+def mvvLvaScore(board, code):
+    startRow, startCol = SQUARE_COORDS[code & 63]
+    endRow, endCol = SQUARE_COORDS[(code >> 6) & 63]
+    if code & ENPASSANT_FLAG:
+        victim = ORDER_VALUES["p"]
+    else:
+        victim = ORDER_VALUES.get(board[endRow][endCol][1], 0)
+    score = 10 * victim - ORDER_VALUES[board[startRow][startCol][1]]
+    if code & PROMOTION_FLAG:
+        score += 10 * ORDER_VALUES[PROMOTION_PIECES[code >> PROMOTION_SHIFT]]
+    return score
+
+# pinDirections of a position without pins (shared, never written to)
+NO_PINS = (None,) * 64
 
 
 class CastleRights:
@@ -541,4 +1147,21 @@ class CastleRights:
         self.wks = wks
         self.bks = bks
         self.wqs = wqs
-        self.bqs = bqs
\ No newline at end of file
+        self.bqs = bqs
+
+"""
+Creates a GameState with the requested board representation:
+"array" is the 8x8 list of strings above, "bitboard" keeps twelve 64-bit piece boards
+(Engine.bitboardState) and generates moves from them. Both expose the same public API.
+"""
+def createGameState(backend="array", fen=None):
+    if backend == "bitboard":
+        from .bitboardState import BitboardGameState
+        gs = BitboardGameState()
+    elif backend == "array":
+        gs = GameState()
+    else:
+        raise ValueError("Unknown GameState backend: " + str(backend))
+    if fen is not None:
+        gs.setFEN(fen)
+    return gs
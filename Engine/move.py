@@ -1,4 +1,31 @@
+"""
+Moves are represented inside the engine as packed ints:
+    bits 0-5   start square (row * 8 + col)
+    bits 6-11  end square
+    bits 12-14 flags (en passant, castle, promotion)
+    bits 15-16 promotion piece (index into PROMOTION_PIECES)
+Full Move objects are only built when the GUI or the notation needs one.
+"""
+ENPASSANT_FLAG = 1 << 12
+CASTLE_FLAG = 2 << 12
+PROMOTION_FLAG = 4 << 12
+PROMOTION_SHIFT = 15
+PROMOTION_PIECES = "QRBN"
+# Code of the null move of the search (GameState.makeNullMove): a8 to a8 (square 0), never a real move
+NULL_MOVE = 0
+
+# Preallocated lookup tables so decoding a move never has to do arithmetic on the hot path
+SQUARE_COORDS = [(sq >> 3, sq & 7) for sq in range(64)]
+# MOVE_IDS[code & 0xFFF] is the moveID of the Move object with the same start/end squares
+MOVE_IDS = [(s >> 3) * 1000 + (s & 7) * 100 + (e >> 3) * 10 + (e & 7) for e in range(64) for s in range(64)]
+
+
 class Move:
+    __slots__ = (
+        "startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured", "promotedPiece",
+        "isEnpassantMove", "isPawnPromotion", "isCastleMove", "isCapture", "moveID",
+    )
+
     ranksToRows = {"1": 7, "2": 6, "3": 5, "4": 4, "5": 3, "6": 2, "7": 1, "8": 0}
     rowsToRanks = {v: k for k, v in ranksToRows.items()}
     fileToCols = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
@@ -10,11 +37,11 @@ class Move:
         self.pieceMoved = board[self.startRow][self.startCol]
         self.pieceCaptured = board[self.endRow][self.endCol]
         self.promotedPiece = ""
-        
+
         self.isEnpassantMove = isEnpassantMove
         if self.isEnpassantMove:
             self.pieceCaptured = "wp" if self.pieceMoved == "bp" else "bp"
-        
+
         self.isPawnPromotion = isPawnPromotion
         if (self.pieceMoved == "wp" and self.endRow == 0) or (self.pieceMoved == "bp" and self.endRow == 7):
             self.isPawnPromotion = True
@@ -25,11 +52,48 @@ class Move:
 
         self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
 
+    """
+    Builds the Move object for a packed move code.
+    `board` must be the position the move is played from (it is only read, not changed).
+    """
+    @classmethod
+    def fromCode(cls, code, board):
+        move = cls.__new__(cls)
+        move.startRow, move.startCol = SQUARE_COORDS[code & 63]
+        move.endRow, move.endCol = SQUARE_COORDS[(code >> 6) & 63]
+        move.pieceMoved = board[move.startRow][move.startCol]
+        move.isEnpassantMove = bool(code & ENPASSANT_FLAG)
+        if move.isEnpassantMove:
+            move.pieceCaptured = board[move.startRow][move.endCol]
+        else:
+            move.pieceCaptured = board[move.endRow][move.endCol]
+        move.isPawnPromotion = bool(code & PROMOTION_FLAG)
+        move.promotedPiece = PROMOTION_PIECES[code >> PROMOTION_SHIFT] if move.isPawnPromotion else ""
+        move.isCastleMove = bool(code & CASTLE_FLAG)
+        move.isCapture = move.pieceCaptured != "--"
+        move.moveID = MOVE_IDS[code & 0xFFF]
+        return move
+
+    # The packed int for this move (computed on access, the GUI may still change promotedPiece)
+    @property
+    def code(self):
+        code = (self.startRow * 8 + self.startCol) | ((self.endRow * 8 + self.endCol) << 6)
+        if self.isEnpassantMove:
+            code |= ENPASSANT_FLAG
+        if self.isCastleMove:
+            code |= CASTLE_FLAG
+        if self.isPawnPromotion:
+            code |= PROMOTION_FLAG | (PROMOTION_PIECES.index(self.promotedPiece or "Q") << PROMOTION_SHIFT)
+        return code
+
     def __eq__(self, other):
         if isinstance(other, Move):
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        return hash(self.moveID)
+
     def getChessNotation(self):
         return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
 
@@ -48,4 +112,4 @@ class Move:
         moveString = self.pieceMoved[1]
         if self.isCapture:
             moveString += "x"
-        return moveString + endSquare
\ No newline at end of file
+        return moveString + endSquare
@@ -0,0 +1,194 @@
+"""
+Perft: counts the leaf nodes of the legal move tree to a fixed depth and compares the totals with
+the published numbers for a set of standard test positions. Any bug in move generation, makeMove or
+undoMove shows up as a wrong count; `divide` splits the count per root move so the faulty branch can
+be narrowed down against a reference engine.
+
+The engine only generates a queen promotion (the GUI asks for the piece afterwards), so every
+promotion is expanded into the four possible pieces here through the promotion bits of the move code.
+
+Usage (from the project root):
+    python -m Engine.perft                              # standard suite on both backends, depth 3
+    python -m Engine.perft --depth 4 --position kiwi
+    python -m Engine.perft --fen "<fen>" --depth 3 --divide
+    python -m Engine.perft --engine sample              # the standalone engine in sampleGame.py
+"""
+import argparse
+import sys
+import time
+
+from .gameState import createGameState
+from .move import Move, PROMOTION_FLAG, PROMOTION_SHIFT, PROMOTION_PIECES
+
+# name -> (FEN, node counts for depth 1, 2, 3, ...)
+# Positions and counts from https://www.chessprogramming.org/Perft_Results
+POSITIONS = {
+    "start": ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+              [20, 400, 8902, 197281, 4865609]),
+    "kiwi": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+             [48, 2039, 97862, 4085603]),
+    "pos3": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+             [14, 191, 2812, 43238, 674624]),
+    "pos4": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+             [6, 264, 9467, 422333]),
+    "pos5": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+             [44, 1486, 62379, 2103487]),
+    "pos6": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+             [46, 2079, 89890, 3894594]),
+}
+
+ENGINES = ("array", "bitboard", "sample")
+
+
+def newGameState(engine, fen):
+    if engine == "sample":
+        # sampleGame pulls in pygame, so it is only imported when asked for
+        import sampleGame
+        return sampleGame.GameState(fen)
+    return createGameState(engine, fen)
+
+
+# --- Move counting ---
+
+"""
+Number of leaf nodes `depth` plies below the current position.
+With bulk counting the last ply is not played: the length of the move list is the count.
+"""
+def perft(gs, depth, bulk=True):
+    moves = gs.getValidMoveCodes()
+    if depth == 1 and bulk:
+        return sum(4 if code & PROMOTION_FLAG else 1 for code in moves)
+    nodes = 0
+    for code in moves:
+        for child in _expandPromotions(code):
+            gs.makeMoveCode(child)
+            nodes += perft(gs, depth - 1, bulk) if depth > 1 else 1
+            gs.undoMove()
+    return nodes
+
+"""
+Same as perft, but returns the count below every root move as a list of (move, nodes).
+"""
+def divide(gs, depth, bulk=True):
+    results = []
+    for code in gs.getValidMoveCodes():
+        for child in _expandPromotions(code):
+            gs.makeMoveCode(child)
+            nodes = perft(gs, depth - 1, bulk) if depth > 1 else 1
+            gs.undoMove()
+            results.append((_codeToUci(child), nodes))
+    return results
+
+def _expandPromotions(code):
+    if code & PROMOTION_FLAG:
+        return [code | (i << PROMOTION_SHIFT) for i in range(len(PROMOTION_PIECES))]
+    return (code,)
+
+def _codeToUci(code):
+    startRow, startCol = divmod(code & 63, 8)
+    endRow, endCol = divmod((code >> 6) & 63, 8)
+    uci = (Move.colsToFiles[startCol] + Move.rowsToRanks[startRow] +
+           Move.colsToFiles[endCol] + Move.rowsToRanks[endRow])
+    if code & PROMOTION_FLAG:
+        uci += PROMOTION_PIECES[code >> PROMOTION_SHIFT].lower()
+    return uci
+
+# The engine in sampleGame.py has its own move format (dicts) and generates every promotion piece itself
+def samplePerft(game, depth, bulk=True):
+    moves = game.generate_legal_moves()
+    if depth == 1 and bulk:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        game.make_move(move)
+        nodes += samplePerft(game, depth - 1, bulk) if depth > 1 else 1
+        game.undo_move()
+    return nodes
+
+def sampleDivide(game, depth, bulk=True):
+    import sampleGame
+    results = []
+    for move in game.generate_legal_moves():
+        game.make_move(move)
+        nodes = samplePerft(game, depth - 1, bulk) if depth > 1 else 1
+        game.undo_move()
+        uci = sampleGame.coords_to_algebraic(*move["from"]) + sampleGame.coords_to_algebraic(*move["to"])
+        if move.get("promotion"):
+            uci += move["promotion"].lower()
+        results.append((uci, nodes))
+    return results
+
+
+# --- Reporting ---
+
+def _formatRate(nodes, seconds):
+    return "{:>12,} nps".format(int(nodes / seconds)) if seconds > 0 else " " * 16
+
+"""
+Runs every (engine, position, depth) combination, printing the count, the time for that depth and
+the speed in nodes per second. Returns True if every count matched the expected one.
+"""
+def runSuite(engines, positions, maxDepth, bulk=True, out=sys.stdout):
+    allPassed = True
+    for engine in engines:
+        totalNodes = totalTime = 0
+        for name in positions:
+            fen, expected = POSITIONS[name]
+            gs = newGameState(engine, fen)
+            count = samplePerft if engine == "sample" else perft
+            for depth in range(1, min(maxDepth, len(expected)) + 1):
+                start = time.perf_counter()
+                nodes = count(gs, depth, bulk)
+                elapsed = time.perf_counter() - start
+                totalNodes += nodes
+                totalTime += elapsed
+                passed = nodes == expected[depth - 1]
+                allPassed = allPassed and passed
+                status = "OK" if passed else "FAIL (expected {:,})".format(expected[depth - 1])
+                out.write("{:<9} {:<6} d{} {:>12,} {:>8.3f}s {}  {}\n".format(
+                    engine, name, depth, nodes, elapsed, _formatRate(nodes, elapsed), status))
+        out.write("{:<9} total     {:>12,} {:>8.3f}s {}\n\n".format(
+            engine, totalNodes, totalTime, _formatRate(totalNodes, totalTime)))
+    return allPassed
+
+def runDivide(engine, fen, depth, bulk=True, out=sys.stdout):
+    gs = newGameState(engine, fen)
+    start = time.perf_counter()
+    if engine == "sample":
+        results = sampleDivide(gs, depth, bulk)
+    else:
+        results = divide(gs, depth, bulk)
+    elapsed = time.perf_counter() - start
+    for uci, nodes in sorted(results):
+        out.write("{}: {}\n".format(uci, nodes))
+    total = sum(nodes for _, nodes in results)
+    out.write("\nmoves {}  nodes {:,}  {:.3f}s {}\n".format(len(results), total, elapsed, _formatRate(total, elapsed)))
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m Engine.perft", description="Move generation perft test")
+    parser.add_argument("--depth", type=int, default=3, help="maximum depth (default 3)")
+    parser.add_argument("--engine", choices=ENGINES, action="append",
+                        help="engine to test, can be repeated (default: array and bitboard)")
+    parser.add_argument("--position", choices=sorted(POSITIONS), action="append",
+                        help="standard position to run, can be repeated (default: all)")
+    parser.add_argument("--fen", help="run divide on this position instead of the suite")
+    parser.add_argument("--divide", action="store_true", help="print the count per root move")
+    parser.add_argument("--no-bulk", dest="bulk", action="store_false",
+                        help="play out the last ply instead of counting the move list")
+    args = parser.parse_args(argv)
+
+    engines = args.engine or ["array", "bitboard"]
+    if args.fen or args.divide:
+        fen = args.fen or POSITIONS[(args.position or ["start"])[0]][0]
+        for engine in engines:
+            print("{} {} depth {}".format(engine, fen, args.depth))
+            runDivide(engine, fen, args.depth, args.bulk)
+        return 0
+    positions = args.position or list(POSITIONS)
+    return 0 if runSuite(engines, positions, args.depth, args.bulk) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
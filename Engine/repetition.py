@@ -0,0 +1,43 @@
+"""
+Keeps track of the positions reached in a game so repetitions can be detected in O(1).
+Positions are identified by their Zobrist key. Besides an occurrence count per key it remembers
+where the last irreversible move (pawn move, capture or castling-rights change) happened:
+no position before that point can ever appear again, so scans never need to look further back.
+"""
+class RepetitionTracker:
+    def __init__(self, startKey):
+        self.keys = [startKey]  # key of every position of the game, in order
+        self.counts = {startKey: 1}
+        # irreversibleLog[i] is the index in keys of the last position reached by an irreversible move
+        self.irreversibleLog = [0]
+
+    def push(self, key, irreversible):
+        self.keys.append(key)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        if irreversible:
+            self.irreversibleLog.append(len(self.keys) - 1)
+        else:
+            self.irreversibleLog.append(self.irreversibleLog[-1])
+
+    def pop(self):
+        key = self.keys.pop()
+        self.irreversibleLog.pop()
+        count = self.counts[key] - 1
+        if count:
+            self.counts[key] = count
+        else:
+            del self.counts[key]
+
+    def isRepetition(self, times=3):
+        # how often the current position has occurred in this game
+        return self.counts[self.keys[-1]] >= times
+
+    def repeatedSinceIrreversible(self):
+        # True if the current position already occurred since the last irreversible move.
+        # Only positions with the same side to move can match, so every other one is skipped.
+        keys = self.keys
+        key = keys[-1]
+        for i in range(len(keys) - 3, self.irreversibleLog[-1] - 1, -2):
+            if keys[i] == key:
+                return True
+        return False
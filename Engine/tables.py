@@ -0,0 +1,75 @@
+"""
+Precomputed move-generation tables, built once when the engine is imported.
+Squares are numbered sq = row * 8 + col (0 is a8, 63 is h1), the same numbering as packed moves.
+
+Two flavours of every table are kept:
+- the *_TARGETS tables list the reachable squares as (row, col, sq) triples, which is what the
+  array backend walks (it needs row/col to index the board and sq to build the move code),
+- the *_ATTACKS/RAYS/BETWEEN tables hold the same squares as 64-bit masks for the bitboard backend
+  and for cheap "is this square in the set" tests.
+Generators walk these instead of adding offsets and bounds-checking every step.
+"""
+
+# Directions as (rowStep, colStep). The first four walk towards higher square numbers (down/right),
+# the last four towards lower ones; direction d + 4 is always the opposite of d.
+DIRECTIONS = [(1, 0), (0, 1), (1, 1), (1, -1), (-1, 0), (0, -1), (-1, -1), (-1, 1)]
+ROOK_DIRECTIONS = (0, 1, 4, 5)
+BISHOP_DIRECTIONS = (2, 3, 6, 7)
+
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+
+def _onBoard(r, c):
+    return 0 <= r < 8 and 0 <= c < 8
+
+def _stepTargets(sq, offsets):
+    r, c = sq >> 3, sq & 7
+    return tuple((r + dr, c + dc, (r + dr) * 8 + c + dc) for dr, dc in offsets if _onBoard(r + dr, c + dc))
+
+def _rayTargets(sq, dr, dc):
+    targets = []
+    r, c = (sq >> 3) + dr, (sq & 7) + dc
+    while _onBoard(r, c):
+        targets.append((r, c, r * 8 + c))
+        r, c = r + dr, c + dc
+    return tuple(targets)
+
+def _mask(targets):
+    mask = 0
+    for _, _, sq in targets:
+        mask |= 1 << sq
+    return mask
+
+
+# --- Square lists (array backend) ---
+KNIGHT_TARGETS = [_stepTargets(sq, KNIGHT_OFFSETS) for sq in range(64)]
+KING_TARGETS = [_stepTargets(sq, KING_OFFSETS) for sq in range(64)]
+# RAY_TARGETS[d][sq] = squares from sq (exclusive) to the edge of the board in direction d, nearest first
+RAY_TARGETS = [[_rayTargets(sq, dr, dc) for sq in range(64)] for dr, dc in DIRECTIONS]
+
+# --- Masks (bitboard backend, set membership) ---
+KNIGHT_ATTACKS = [_mask(targets) for targets in KNIGHT_TARGETS]
+KING_ATTACKS = [_mask(targets) for targets in KING_TARGETS]
+# squares a pawn of the given color on sq attacks
+PAWN_ATTACKS = {
+    "w": [_mask(_stepTargets(sq, ((-1, -1), (-1, 1)))) for sq in range(64)],
+    "b": [_mask(_stepTargets(sq, ((1, -1), (1, 1)))) for sq in range(64)],
+}
+RAYS = [[_mask(targets) for targets in rays] for rays in RAY_TARGETS]
+
+# BETWEEN[a][b] = squares strictly between a and b if they share a line, else 0
+BETWEEN = [[0] * 64 for _ in range(64)]
+# LINE_THROUGH[a][b] = the whole line through a and b (both included) if they share one, else 0
+LINE_THROUGH = [[0] * 64 for _ in range(64)]
+# DIRECTION_INDEX[a][b] = the direction d leading from a to b, or -1 if they don't share a line
+DIRECTION_INDEX = [[-1] * 64 for _ in range(64)]
+for _d in range(8):
+    for _a in range(64):
+        _line = RAYS[_d][_a] | RAYS[(_d + 4) % 8][_a] | (1 << _a)
+        _between = 0
+        for _, _, _b in RAY_TARGETS[_d][_a]:
+            BETWEEN[_a][_b] = _between
+            LINE_THROUGH[_a][_b] = _line
+            DIRECTION_INDEX[_a][_b] = _d
+            _between |= 1 << _b
@@ -0,0 +1,51 @@
+import random
+
+"""
+Zobrist hashing keys.
+Every (piece, square) pair, the side to move, each castling-rights combination and each
+en-passant file gets its own random 64-bit number. A position's key is the XOR of the
+numbers of everything that is "on" in it, so a move only has to XOR in/out what changed.
+"""
+
+# Fixed seed so keys (and anything persisted with them) are the same on every run
+_rng = random.Random(0x5EED2C4E55)
+
+def _randomKey():
+    return _rng.getrandbits(64)
+
+PIECES = ["wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK"]
+
+# pieceKeys["wN"][row * 8 + col]
+pieceKeys = {piece: [_randomKey() for _ in range(64)] for piece in PIECES}
+
+# XORed in when it is black to move
+sideKey = _randomKey()
+
+# Indexed by castleIndex(rights), one key per combination of the four flags
+castleKeys = [_randomKey() for _ in range(16)]
+
+# Indexed by the column of the en-passant square
+enpassantKeys = [_randomKey() for _ in range(8)]
+
+
+def castleIndex(rights):
+    return (rights.wks and 1) | (rights.wqs and 2) | (rights.bks and 4) | (rights.bqs and 8)
+
+
+"""
+Builds the key of a position from scratch.
+Only needed when a position is set up; after that makeMove/undoMove keep it up to date.
+"""
+def computeKey(gs):
+    key = 0
+    for r in range(8):
+        for c in range(8):
+            piece = gs.board[r][c]
+            if piece != "--":
+                key ^= pieceKeys[piece][r * 8 + c]
+    if not gs.whiteToMove:
+        key ^= sideKey
+    key ^= castleKeys[castleIndex(gs.currentCastlingRights)]
+    if gs.enpassantPossible != ():
+        key ^= enpassantKeys[gs.enpassantPossible[1]]
+    return key
@@ -1,3 +1,4 @@
+import os
 import pygame as p
 
 # Dimensions
@@ -12,13 +13,41 @@ MAX_FPS = 15
 # Colors
 COLORS = [p.Color(240, 217, 181), p.Color(181, 136, 99)]
 
+# Board representation used by the engine: "array" (8x8 list) or "bitboard".
+# The bitboard backend also keeps the 8x8 list up to date on every move, so it is the slower of the two
+ENGINE_BACKEND = "array"
+
 # Difficulty Levels (Depth)
+# Search limits per difficulty, passed to moveFinder.findBestMoveMinMax:
+# the AI deepens its search until it has used timeLimit seconds or nodeLimit positions
+# (None = no limit), without going deeper than depth
 DIFFICULTY = {
-    'EASY': 2,
-    'MEDIUM': 3,
-    'HARD': 5
+    'EASY': {'depth': 2, 'timeLimit': 0.5, 'nodeLimit': 3000},
+    'MEDIUM': {'depth': 64, 'timeLimit': 1.5, 'nodeLimit': None},
+    'HARD': {'depth': 64, 'timeLimit': 5.0, 'nodeLimit': None}
 }
 
+# Memory for the AI's transposition table, in MB
+TT_SIZE_MB = 16
+# File the engine loads its transposition table from at start and saves it to when it quits,
+# so what it learned carries over to the next run (None = start empty every time)
+TT_FILE = None
+
+# Processes the AI searches with: 1 = a single search process, more = the root moves are split over
+# that many helper processes (see AI/parallel.py)
+SEARCH_WORKERS = 1
+
+# File the AI appends the result and stats (nodes, nodes/sec, branching factor, TT hits, ...) of every
+# search to, one JSON object per line (None = no log)
+SEARCH_LOG = None
+
+# Profiling of the AI's searches (see AI/profiling.py): directory the worker writes a cProfile dump of
+# every search to (None = off), and whether to also time the engine's hot paths into collapsed stacks.
+# Set by the CHESS_PROFILE=<directory> and CHESS_PROFILE_TIMERS=1 environment variables, or by
+# main.py --profile <directory> --profile-timers
+PROFILE_DIR = os.environ.get("CHESS_PROFILE") or None
+PROFILE_TIMERS = os.environ.get("CHESS_PROFILE_TIMERS", "") not in ("", "0")
+
 # AI Scores
 CHECKMATE = 1000
 STALEMATE = 0
\ No newline at end of file
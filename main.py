@@ -1,13 +1,14 @@
 import sys
 import os
-from multiprocessing import Process, Queue
+import argparse
 import pygame as p
 
 # --- Import Project Files ---
 import config
-from Engine.gameState import GameState
+from Engine.gameState import createGameState
 from Engine.move import Move
 from AI import moveFinder
+from AI.worker import EngineWorker
 
 # --- Path Setup ---
 current_path = os.path.dirname(__file__)
@@ -22,7 +23,20 @@ def loadImages():
         img = os.path.join(image_path, piece + ".png")
         IMAGES[piece] = p.transform.scale(p.image.load(img), (config.SQ_SIZE, config.SQ_SIZE))
 
-def main():
+"""
+Command line: --profile DIR profiles every AI search into DIR, --profile-timers also times the
+engine's hot paths (see AI/profiling.py); both default to the CHESS_PROFILE* environment variables.
+"""
+def parseArguments(argv=None):
+    parser = argparse.ArgumentParser(description="Chess game against the AI")
+    parser.add_argument("--profile", metavar="DIR", default=config.PROFILE_DIR,
+                        help="write a profile of every AI search to DIR")
+    parser.add_argument("--profile-timers", action="store_true", default=config.PROFILE_TIMERS,
+                        help="with --profile, also time move generation, make/undo and the evaluation")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parseArguments(argv)
     p.init()
     p.display.set_caption("ChessEngine")
     screen = p.display.set_mode((config.BOARD_WIDTH, config.BOARD_HEIGHT))
@@ -34,7 +48,7 @@ def main():
     menuFont = p.font.SysFont("Arial", 24, True, False)
     
     # Initialize Game State
-    gs = GameState()
+    gs = createGameState(config.ENGINE_BACKEND)
     validMoves = gs.getValidMoves()
     moveMade = False
     animate = False
@@ -57,7 +71,9 @@ def main():
     
     # AI Variables
     AIThinking = False
-    moveFinderProcess = None
+    # one search process for the whole session
+    engine = EngineWorker(config.ENGINE_BACKEND, profileDir=args.profile, profileTimers=args.profile_timers)
+    searchId = None # id of the search the GUI is waiting for
     moveUndone = False
     current_difficulty = config.DIFFICULTY['MEDIUM']
 
@@ -168,13 +184,13 @@ def main():
                     animate = False
                     gameOver = False
                     if AIThinking:
-                        moveFinderProcess.terminate()
+                        engine.stop()
                         AIThinking = False
                     moveUndone = True
                 
                 elif e.key == p.K_r: # Reset Logic
                     # Reset everything including menu
-                    gs = GameState()
+                    gs = createGameState(config.ENGINE_BACKEND)
                     validMoves = gs.getValidMoves()
                     sqSelected = ()
                     playerClicks = []
@@ -184,8 +200,9 @@ def main():
                     gameStarted = False # Go back to menu
                     menuState = 'MODE' # Reset menu state
                     if AIThinking:
-                        moveFinderProcess.terminate()
+                        engine.stop()
                         AIThinking = False
+                    engine.newGame()
                     moveUndone = False
 
         # --- AI Turn Logic ---
@@ -193,14 +210,20 @@ def main():
             if not AIThinking:
                 AIThinking = True
                 print("AI is thinking...")
-                returnQueue = Queue()
-                moveFinderProcess = Process(
-                    target=moveFinder.findBestMoveMinMax,
-                    args=(gs, validMoves, returnQueue, current_difficulty)
-                )
-                moveFinderProcess.start()
-                
-                AIMove = returnQueue.get()
+                # Only the move codes go to the engine, it replays what changed since the last search
+                engine.setPosition(gs.moveLog)
+                searchId = engine.go(current_difficulty)
+            
+            # Never wait for the engine: check once per frame and keep drawing/handling events meanwhile
+            AIDone, AIMoveCode = engine.pollMove(searchId)
+            if AIDone:
+                if engine.principalVariation:
+                    print("AI line:", moveFinder.formatVariation(gs, engine.principalVariation))
+                if engine.stats:
+                    print("AI search: depth {} ({} sel), {:,} nodes, {:,.0f} nodes/s".format(
+                        len(engine.stats["iterations"]), engine.stats["selDepth"], engine.stats["nodes"],
+                        engine.stats["nodesPerSecond"]))
+                AIMove = Move.fromCode(AIMoveCode, gs.board) if AIMoveCode is not None else None
                 
                 if AIMove is None:
                     AIMove = moveFinder.findRandomMoves(validMoves)
@@ -212,7 +235,7 @@ def main():
 
         if moveMade:
             if animate:
-                animateMove(gs.moveLog[-1], screen, gs.board, clock)
+                animateMove(gs.getLastMove(), screen, gs.board, clock)
             validMoves = gs.getValidMoves()
             moveMade = False
             animate = False
@@ -228,6 +251,8 @@ def main():
         clock.tick(config.MAX_FPS)
         p.display.flip()
 
+    engine.quit()
+
 # ---------------------------------------------------
 # Graphic & UI Functions
 # ---------------------------------------------------
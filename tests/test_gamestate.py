@@ -0,0 +1,78 @@
+import pytest
+
+from Engine.gameState import createGameState
+from Engine.move import Move
+from Engine.perft import POSITIONS
+from Engine import zobrist
+
+BACKENDS = ("array", "bitboard")
+
+FENS = [fen for fen, _ in POSITIONS.values()] + [
+    "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e6 0 2",
+    "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",
+    "8/8/8/8/8/4k3/8/4K3 b - - 12 60",
+]
+
+
+# Plays moves given as "e2e4" (promotions to a queen) and returns their codes
+def play(gs, *moves):
+    codes = []
+    for notation in moves:
+        code = next(code for code in gs.getValidMoveCodes()
+                    if Move.fromCode(code, gs.board).getChessNotation() == notation)
+        gs.makeMoveCode(code)
+        codes.append(code)
+    return codes
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("fen", FENS)
+def test_fen_round_trip(backend, fen):
+    assert createGameState(backend, fen).toFEN() == fen
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_fen_after_moves(backend):
+    gs = createGameState(backend)
+    play(gs, "e2e4", "c7c5", "g1f3")
+    assert gs.toFEN() == "rnbqkbnr/pp1ppppp/8/2p5/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2"
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_incremental_zobrist_key(backend):
+    gs = createGameState(backend, POSITIONS["kiwi"][0])
+    startKey = gs.zobristKey
+    assert startKey == zobrist.computeKey(gs)
+    # castling, captures, a double pawn push, en passant and a promotion
+    codes = play(gs, "e1g1", "h3g2", "a2a4", "b4a3", "d5e6", "g2f1")
+    assert gs.zobristKey == zobrist.computeKey(gs)
+    assert gs.zobristKey == createGameState(backend, gs.toFEN()).zobristKey
+    for _ in codes:
+        gs.undoMove()
+    assert gs.zobristKey == startKey
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_threefold_repetition_is_a_draw(backend):
+    gs = createGameState(backend)
+    shuffle = ("g1f3", "g8f6", "f3g1", "f6g8")
+    play(gs, *shuffle)
+    assert gs.repetitions.repeatedSinceIrreversible()
+    assert not gs.repetitions.isRepetition()
+    play(gs, *shuffle)
+    assert gs.repetitions.isRepetition()
+    gs.getValidMoves()
+    assert gs.stalemate
+    gs.undoMove()
+    gs.getValidMoves()
+    assert not gs.stalemate
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_no_repetition_across_irreversible_moves(backend):
+    gs = createGameState(backend)
+    play(gs, "g1f3", "g8f6", "f3g1", "f6g8", "e2e3")
+    # nothing played before the pawn move can come back
+    assert not gs.repetitions.repeatedSinceIrreversible()
+    play(gs, "g8f6", "g1f3", "f6g8", "f3g1")
+    assert gs.repetitions.repeatedSinceIrreversible()
@@ -0,0 +1,25 @@
+import pytest
+
+from Engine.perft import POSITIONS, perft
+from Engine.gameState import createGameState
+
+BACKENDS = ("array", "bitboard")
+
+# (position, depth) pairs that stay fast enough for a test run
+CASES = [("start", 3), ("kiwi", 3), ("pos3", 4)]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("name, depth", CASES)
+def test_perft(backend, name, depth):
+    fen, counts = POSITIONS[name]
+    gs = createGameState(backend, fen)
+    assert perft(gs, depth) == counts[depth - 1]
+    # make/undo leave the position as it was
+    assert gs.toFEN() == fen
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_perft_without_bulk_counting(backend):
+    fen, counts = POSITIONS["kiwi"]
+    assert perft(createGameState(backend, fen), 2, bulk=False) == counts[1]
@@ -0,0 +1,25 @@
+import pytest
+
+from Engine.gameState import createGameState
+
+BACKENDS = ("array", "bitboard")
+
+# Black's Rxg3 can be retaken by Qh4 or by Qb3 (which would let Ra3 recapture): both backends must
+# pick the same queen, the one on the lowest square (h4)
+TIE_FEN = "2N3nk/7p/7P/2p5/2P4Q/rQ2r1P1/P7/3K4 b - - 1 47"
+RXG3 = 2988
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_equal_attackers_tie_break(backend):
+    gs = createGameState(backend, TIE_FEN)
+    assert gs.leastValuableAttacker(46, "w", 1 << 44) == (39, "Q")
+    assert gs.staticExchange(RXG3) == -4
+
+
+def test_backends_agree_on_every_capture():
+    array = createGameState("array", TIE_FEN)
+    bitboard = createGameState("bitboard", TIE_FEN)
+    for code in array.getValidMoveCodes():
+        if array.isCaptureOrPromotion(code):
+            assert array.staticExchange(code) == bitboard.staticExchange(code)
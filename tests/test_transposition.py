@@ -0,0 +1,95 @@
+import pytest
+
+from AI.transposition import EXACT, LOWER_BOUND, TranspositionTable, SharedTranspositionTable
+
+
+@pytest.fixture(params=["local", "shared"])
+def table(request):
+    if request.param == "local":
+        yield TranspositionTable(1)
+    else:
+        table = SharedTranspositionTable(1)
+        yield table
+        table.close()
+
+
+# Three keys that fall into the same bucket
+def bucketKeys(table, bucket=5):
+    return [bucket + i * (table.mask + 1) for i in range(3)]
+
+
+def test_probe_returns_what_was_stored(table):
+    key = bucketKeys(table)[0]
+    assert table.probe(key) is None
+    table.store(key, 1.5, 4, LOWER_BOUND, 1234)
+    assert table.probe(key) == (1.5, 4, LOWER_BOUND, 1234)
+
+
+def test_update_keeps_the_best_move(table):
+    key = bucketKeys(table)[0]
+    table.store(key, 1.0, 3, EXACT, 1234)
+    table.store(key, 2.0, 4, EXACT, None)
+    assert table.probe(key) == (2.0, 4, EXACT, 1234)
+
+
+def test_deepest_entry_stays(table):
+    deep, shallow, other = bucketKeys(table)
+    table.store(deep, 1.0, 6, EXACT, None)
+    table.store(shallow, 2.0, 2, EXACT, None)
+    # a shallower search of another position goes to the always-replace slot
+    table.store(other, 3.0, 3, EXACT, None)
+    assert table.probe(deep) == (1.0, 6, EXACT, None)
+    assert table.probe(shallow) is None
+    assert table.probe(other) == (3.0, 3, EXACT, None)
+    assert table.stats()["overwrites"] == 1
+
+
+def test_old_entries_are_replaced(table):
+    deep, shallow, other = bucketKeys(table)
+    table.store(deep, 1.0, 6, EXACT, None)
+    table.store(shallow, 2.0, 2, EXACT, None)
+    table.newSearch()
+    table.store(other, 3.0, 1, EXACT, None)
+    assert table.probe(deep) is None
+    assert table.probe(shallow) == (2.0, 2, EXACT, None)
+    assert table.probe(other) == (3.0, 1, EXACT, None)
+
+
+def test_position_in_second_slot_is_updated_in_place(table):
+    deep, shallow, _ = bucketKeys(table)
+    table.store(deep, 1.0, 6, EXACT, None)
+    table.store(shallow, 2.0, 2, EXACT, None)
+    # the depth/age rule would now pick the first slot, but `shallow` is already in the second one
+    table.newSearch()
+    table.store(shallow, 3.0, 4, EXACT, None)
+    assert table.probe(shallow) == (3.0, 4, EXACT, None)
+    assert table.probe(deep) == (1.0, 6, EXACT, None)
+    assert table.stats()["overwrites"] == 0
+    table.store(shallow, 4.0, 5, EXACT, None)
+    assert table.probe(shallow) == (4.0, 5, EXACT, None)
+
+
+def test_used_slots():
+    table = TranspositionTable(1)
+    deep, shallow, _ = bucketKeys(table)
+    table.store(deep, 1.0, 6, EXACT, None)
+    table.store(shallow, 2.0, 2, EXACT, None)
+    table.newSearch()
+    table.store(shallow, 3.0, 4, EXACT, None)
+    assert table.stats()["used"] == 2
+
+
+def test_saved_table_loads(tmp_path):
+    path = str(tmp_path / "table.bin")
+    table = SharedTranspositionTable(1)
+    try:
+        table.store(77, 0.5, 3, EXACT, 99)
+        table.save(path)
+    finally:
+        table.close()
+    loaded = SharedTranspositionTable(1)
+    try:
+        loaded.load(path)
+        assert loaded.probe(77) == (0.5, 3, EXACT, 99)
+    finally:
+        loaded.close()